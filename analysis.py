@@ -0,0 +1,163 @@
+#analysis.py
+
+# pandas is imported by the functions here, which only `analyze` calls
+from commit_store import load_commits, stored_labs
+import settings as s
+
+# width of the longest bar in the commit-hour histogram
+HISTOGRAM_WIDTH = 40
+
+
+def late_night(hours, late_hours=s.LATE_NIGHT_HOURS):
+    "Marks the commit hours (HKT) that fall in late_hours, e.g. (0, 6) for midnight to 6am"
+    start, end = late_hours
+    if start <= end:
+        return (hours >= start) & (hours < end)
+    return (hours >= start) | (hours < end)
+
+
+def bursts(commits):
+    """Returns the most commits each student made within any one hour.
+
+    Sorts the commits by student and time once, then finds where each
+    commit's hour began with a binary search over the whole array, instead of
+    a rolling window per student.
+    """
+    import numpy as np
+    import pandas as pd
+    codes, students = pd.factorize(commits["student"])
+    seconds = ((commits["date"] - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)).to_numpy(np.int64)
+    order = np.lexsort((seconds, codes))
+    # one sorted key for (student, time); no two students' commits are within an hour of each other
+    keys = codes[order].astype(np.int64) * 2 ** 40 + seconds[order]
+    in_hour = np.arange(len(keys)) - np.searchsorted(keys, keys - 3599, side="left") + 1
+    most = np.zeros(len(students), dtype=np.int64)
+    np.maximum.at(most, codes[order], in_hour)
+    return pd.Series(most, index=students)
+
+
+def student_summary(commits, users, sections=None):
+    """Aggregates the commits of each student, across every lab in `commits`.
+
+    Args:
+        commits (DataFrame): stored commits, as load_commits returns them
+        users (list): every student to report, including those with no commits
+        sections (dict): maps each student to their section
+
+    Returns:
+        A DataFrame indexed by student with their section, commits, additions,
+        deletions, churn (additions + deletions), active days, late-night
+        commits, burst (most commits within any hour), and first and last commit.
+    """
+    import pandas as pd
+    commits = commits.assign(
+        churn=commits["additions"] + commits["deletions"],
+        day=commits["date"].dt.normalize(),
+        late=late_night(commits["date"].dt.hour),
+    )
+    by_student = commits.groupby("student")
+    summary = by_student.agg(
+        commits=("date", "size"),
+        additions=("additions", "sum"),
+        deletions=("deletions", "sum"),
+        churn=("churn", "sum"),
+        days=("day", "nunique"),
+        late=("late", "sum"),
+        first=("date", "min"),
+        last=("date", "max"),
+    )
+    summary["burst"] = bursts(commits)
+
+    counts = ["commits", "additions", "deletions", "churn", "days", "late", "burst"]
+    summary = summary.reindex(pd.Index(users, name="student"))
+    summary[counts] = summary[counts].fillna(0).astype(int)
+    summary.insert(0, "section", pd.Series(sections or {}, dtype=object).reindex(summary.index))
+    return summary
+
+
+def section_summary(students):
+    """Compares sections, from the per-student summary: students, how many
+    committed at all, median commits and churn per student, and the share of
+    commits made late at night.
+    """
+    by_section = students.assign(
+        section=students["section"].fillna("-"),
+        active=students["commits"] > 0,
+    ).groupby("section")
+    sections = by_section.agg(
+        students=("commits", "size"),
+        active=("active", "sum"),
+        median_commits=("commits", "median"),
+        median_churn=("churn", "median"),
+        commits=("commits", "sum"),
+        late=("late", "sum"),
+    )
+    sections["late_share"] = (sections["late"] / sections["commits"].where(sections["commits"] > 0)).fillna(0).round(2)
+    return sections.drop(columns=["late"])
+
+
+def hour_histogram(commits):
+    "Returns the number of commits made in each hour of the day (HKT), 0 to 23"
+    return commits["date"].dt.hour.value_counts().reindex(range(24), fill_value=0)
+
+
+def print_histogram(hours):
+    print(f"{s.CYAN}Commits by hour (HKT){s.RESET}")
+    largest = max(hours.max(), 1)
+    for hour, count in hours.items():
+        bar = "#" * round(HISTOGRAM_WIDTH * count / largest)
+        print(f"{hour:02d}:00  {count:>6}  {bar}")
+    print()
+
+
+def analyze(course, labs, users, sections=None, out=None):
+    """Prints per-student and per-section aggregates, and a histogram of commit
+    hours, from the commits `log` stored for some labs. Needs no GitHub requests.
+
+    Args:
+        course (string): course code from the roster
+        labs (list): lab template names, or ["all"] for every stored lab of the course
+        users (list): student github usernames
+        sections (dict): maps each student to their section
+        out (string): optional CSV file the per-student table is also written to
+
+    Returns the per-student summary, or None when nothing is stored.
+    """
+    import pandas as pd
+    if labs == ["all"]:
+        labs = stored_labs(course)
+
+    commits = load_commits(course, labs)
+    commits = commits[commits["student"].isin(users)]
+    if commits.empty:
+        print(f"No stored commits for {', '.join(labs) or course}; run `log` for the lab first.")
+        print()
+        return None
+
+    students = student_summary(commits, users, sections)
+    width = pd.get_option("display.width")
+    pd.set_option("display.width", None)
+    try:
+        print(f"{s.CYAN}{len(commits)} commits by {len(users)} students in {', '.join(labs)}{s.RESET}")
+        print()
+        print_histogram(hour_histogram(commits))
+
+        print(f"{s.CYAN}Students, from the most commits to the fewest{s.RESET}")
+        shown = students.assign(
+            first=students["first"].dt.strftime("%Y-%m-%d %H:%M"),
+            last=students["last"].dt.strftime("%Y-%m-%d %H:%M"),
+        ).fillna({"section": "", "first": "", "last": ""})
+        print(shown.sort_values(["commits", "churn"], ascending=False).to_string())
+        print()
+
+        print(f"{s.CYAN}Sections{s.RESET}")
+        print(section_summary(students).to_string())
+        print()
+    finally:
+        pd.set_option("display.width", width)
+
+    if out:
+        students.to_csv(out)
+        print(f"Wrote the per-student table to '{out}'.")
+        print()
+    return students
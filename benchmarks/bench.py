@@ -0,0 +1,200 @@
+#bench.py
+
+# Times each mode of repo_management.py against a local fake GitHub, for
+# synthetic rosters of 10, 100 and 1000 students.
+#
+#   python benchmarks/bench.py
+#   python benchmarks/bench.py --sizes 100 --cases "log graphql" "log rest" --latency 0.05
+#   python benchmarks/bench.py --json after.json --compare before.json
+#   python benchmarks/bench.py --sizes 100 --labs 4
+
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from fake_github import FakeGitHub
+from local_git import GIT_ENV, repo_log
+import settings as s
+
+ORG = "bench-org"
+COURSE = "bench"
+LAB = "lab"
+
+# students' commits carry their own offset, as GitHub shows them for students in HKT
+HKT = timezone(timedelta(hours=8))
+
+# partway through the history make_template writes, which starts 2025-01-01 08:00 HKT (00:00 UTC)
+DEADLINE = "2025-01-01 18:00"
+
+# touch: mark every repo as pushed to before the case, so it has work to do
+Case = namedtuple("Case", ["name", "mode", "args", "touch"])
+
+# in the order they run; later cases use what earlier ones made
+CASES = [
+    Case("create", "create", [], False),
+    Case("status", "status", [], False),
+    Case("log graphql", "log", [], False),
+    Case("log rest", "log", ["--source", "rest"], False),
+    Case("log since-last", "log", ["--since-last"], False),
+    Case("log rest since-last", "log", ["--source", "rest", "--since-last"], True),
+    Case("clone", "clone", [], False),
+    Case("log local", "log", ["--source", "local"], False),
+    Case("analyze", "analyze", [], False),
+    Case("latest graphql", "latest", [], False),
+    Case("latest local", "latest", ["--source", "local"], False),
+    Case("snapshot graphql", "snapshot", ["--deadline", DEADLINE], False),
+    Case("snapshot local", "snapshot", ["--deadline", DEADLINE, "--source", "local"], False),
+    Case("pull", "pull", [], True),
+    Case("delete", "delete", ["--yes"], False),
+]
+
+# ok is False when the process failed or any student did; failed is how many students did
+Result = namedtuple("Result", ["size", "case", "seconds", "requests", "rss_mb", "git_rss_mb", "ok", "failed"])
+
+
+def make_template(path, commits):
+    """Makes a bare repo at `path` with a template commit followed by `commits`
+    student commits, one hour apart, each changing a few lines.
+    """
+    work = f"{path}.work"
+    env = {
+        **GIT_ENV,
+        "GIT_AUTHOR_NAME": "student", "GIT_AUTHOR_EMAIL": "student@example.com",
+        "GIT_COMMITTER_NAME": "student", "GIT_COMMITTER_EMAIL": "student@example.com",
+    }
+    def git(*args, cwd=work, **extra):
+        subprocess.run(["git", *args], cwd=cwd, env={**env, **extra}, check=True, capture_output=True)
+
+    os.makedirs(work)
+    git("init", "-q", "-b", "main")
+    start = datetime(2025, 1, 1, 8, tzinfo=HKT)
+    for i in range(commits + 1):
+        with open(f"{work}/lab.py", "a") as file:
+            file.write("".join(f"# commit {i} line {j}\n" for j in range(i % 7 + 1)))
+        date = (start + timedelta(hours=i)).isoformat()
+        git("add", "lab.py")
+        git("commit", "-q", "-m", "Template" if i == 0 else f"Work on step {i}", GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date)
+    git("clone", "-q", "--bare", work, path, cwd=os.path.dirname(path))
+    return repo_log(work)
+
+
+def write_roster(path, size):
+    with open(path, "w") as file:
+        file.write("course,login,section\n")
+        for i in range(size):
+            file.write(f"{COURSE},student{i:04d},\n")
+
+
+def lab_names(count):
+    "The template labs of a run over `count` labs"
+    return [LAB] if count == 1 else [f"{LAB}{i}" for i in range(1, count + 1)]
+
+
+def run_case(fake, work, case, size, jobs, rate, labs):
+    "Runs one case in a fresh process and returns its Result"
+    if case.touch:
+        fake.touch()
+    result_file = f"{work}/result.json"
+    log_file = f"{work}/logs/{size}_{case.name.replace(' ', '_')}.txt"
+    command = [
+        sys.executable, os.path.join(os.path.dirname(__file__), "run_case.py"),
+        "--work", work, "--api", fake.url, "--org", ORG, "--course", COURSE, "--result", result_file,
+        *(["--rate", str(rate)] if rate else []),
+        case.mode, "--course", COURSE, "--lab", *labs, "--jobs", str(jobs), *case.args,
+    ]
+
+    before = fake.requests
+    with open(log_file, "w") as log:
+        process = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT)
+    requests = fake.requests - before
+
+    if process.returncode != 0:
+        return Result(size, case.name, None, requests, None, None, False, None)
+    with open(result_file) as file:
+        data = json.load(file)
+    failed = data["failed"]
+    return Result(size, case.name, data["seconds"], requests, data["rss_mb"], data["git_rss_mb"], not failed, failed)
+
+
+def print_results(results, baseline=None):
+    print(f"{s.CYAN}{'students':>8}  {'case':<20}{'seconds':>9}{'requests':>10}{'rss MB':>9}{'git MB':>8}  {'vs baseline' if baseline else ''}{s.RESET}")
+    for r in results:
+        if not r.ok:
+            reason = f"  {r.failed} students failed, see the log" if r.failed else ""
+            print(f"{r.size:>8}  {r.case:<20}{'failed':>9}{r.requests:>10}{reason}")
+            continue
+        line = f"{r.size:>8}  {r.case:<20}{r.seconds:>9.2f}{r.requests:>10}{r.rss_mb:>9.1f}{r.git_rss_mb:>8.1f}"
+        old = (baseline or {}).get((r.size, r.case))
+        if old and old["ok"]:
+            line += f"  {r.seconds / old['seconds']:.2f}x time, {r.requests - old['requests']:+d} requests"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark repo_management.py against a local fake GitHub")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Roster sizes to run")
+    parser.add_argument("--cases", nargs="+", choices=[case.name for case in CASES], help="Cases to run (default: all)")
+    parser.add_argument("--labs", type=int, default=1, help="Labs every case covers in one run, each with a repo per student")
+    parser.add_argument("--commits", type=int, default=s.TYPICAL_COMMITS, help="Student commits in every repo")
+    parser.add_argument("--jobs", type=int, default=s.JOBS, help="--jobs passed to every case")
+    parser.add_argument("--rate", type=float, help="Client request rate per second (default: unthrottled)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the server waits before each reply")
+    parser.add_argument("--rate-limit", type=int, help="Requests the server allows per window and resource")
+    parser.add_argument("--rate-window", type=float, default=60, help="Seconds until the server's rate limit resets")
+    parser.add_argument("--secondary-every", type=int, default=0, help="Refuse every n-th request with a secondary rate limit")
+    parser.add_argument("--keep", action="store_true", help="Keep the work directory, with each case's output in logs/")
+    parser.add_argument("--json", help="Save the results to this file")
+    parser.add_argument("--compare", help="Compare with results saved by --json")
+    args = parser.parse_args()
+
+    cases = [case for case in CASES if not args.cases or case.name in args.cases]
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = {(r["size"], r["case"]): r for r in json.load(file)}
+
+    root = tempfile.mkdtemp(prefix="repoview-bench-")
+    template = f"{root}/template.git"
+    history = make_template(template, args.commits)
+
+    fake = FakeGitHub(ORG, history, template, args.latency, args.rate_limit, args.rate_window, args.secondary_every)
+    fake.start()
+
+    results = []
+    try:
+        for size in args.sizes:
+            work = f"{root}/{size}"
+            os.makedirs(f"{work}/logs")
+            with open(f"{work}/secret.py", "w") as file:
+                file.write('GITHUB_ACCESS_TOKEN = "benchmark"\n')
+            write_roster(f"{work}/roster.csv", size)
+            fake.reset(lab_names(args.labs))
+
+            for case in cases:
+                print(f"{size} students: {case.name}...", file=sys.stderr)
+                results.append(run_case(fake, work, case, size, args.jobs, args.rate, lab_names(args.labs)))
+    finally:
+        fake.stop()
+        if args.keep:
+            print(f"Work directory: {root}", file=sys.stderr)
+        else:
+            shutil.rmtree(root)
+
+    print()
+    print_results(results, baseline)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump([r._asdict() for r in results], file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+#fake_github.py
+
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+import hashlib
+import json
+import re
+import socket
+import threading
+import time
+
+
+class FakeGitHub:
+    """A stand-in for the parts of the GitHub REST and GraphQL APIs this repo
+    uses, served on localhost so the modes can be timed without touching
+    GitHub or its rate limits.
+
+    Every student repo has the same history, `history`, and clones from the
+    same local bare repo, `clone_url`.
+
+    Args:
+        org (string): login of the organization served
+        history (list): CommitRecords, newest first, served for every repo
+        clone_url (string): path of a local bare repo that every repo clones from
+        latency (float): seconds to wait before answering each request
+        rate_limit (int): requests allowed per `rate_window` seconds and resource; None for no limit
+        rate_window (float): seconds until an exhausted rate limit resets
+        secondary_every (int): refuse every n-th request with a secondary rate limit; 0 never
+    """
+    def __init__(self, org, history, clone_url, latency=0.0, rate_limit=None, rate_window=3600, secondary_every=0):
+        self.org = org
+        self.history = [
+            {
+                "sha": commit.sha,
+                "date": commit.date.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                # GraphQL gives author dates in the author's offset, e.g. +08:00
+                "author_date": commit.date.isoformat(),
+                "additions": commit.additions,
+                "deletions": commit.deletions,
+                "message": commit.message,
+            }
+            for commit in history
+        ]
+        self.clone_url = clone_url
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.secondary_every = secondary_every
+        self.repos = {}
+        self.pushes = 0
+        self.requests = 0
+        self.budgets = {}
+        self._lock = threading.Lock()
+        self.server = None
+        self.url = None
+
+    def start(self):
+        "Starts serving on a free localhost port, in a background thread"
+        fake = self
+
+        class Handler(FakeHandler):
+            github = fake
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset(self, repo_names=()):
+        "Replaces every repo in the organization with `repo_names`"
+        with self._lock:
+            self.repos = {name: self.new_repo() for name in repo_names}
+
+    def touch(self):
+        "Marks every repo as pushed to just now"
+        with self._lock:
+            # pushed_at has one second resolution; make sure it changes
+            self.pushes += 1
+            pushed_at = (datetime.now(timezone.utc) + timedelta(seconds=self.pushes)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            for repo in self.repos.values():
+                repo["pushed_at"] = pushed_at
+
+    def new_repo(self):
+        return {"pushed_at": now(), "collaborators": set()}
+
+    def repo_json(self, name):
+        return {
+            "id": int(hashlib.md5(name.encode()).hexdigest()[:8], 16),
+            "name": name,
+            "full_name": f"{self.org}/{name}",
+            "owner": {"login": self.org, "type": "Organization"},
+            "private": True,
+            "url": f"{self.url}/repos/{self.org}/{name}",
+            "clone_url": self.clone_url,
+            "pushed_at": self.repos[name]["pushed_at"],
+            "default_branch": "main",
+            "size": 10,
+        }
+
+    def commit_json(self, name, commit, stats=False):
+        data = {
+            "sha": commit["sha"],
+            "url": f"{self.url}/repos/{self.org}/{name}/commits/{commit['sha']}",
+            "commit": {
+                "message": commit["message"],
+                "author": {"name": "student", "date": commit["date"]},
+            },
+        }
+        if stats:
+            total = commit["additions"] + commit["deletions"]
+            data["stats"] = {"additions": commit["additions"], "deletions": commit["deletions"], "total": total}
+        return data
+
+    def history_since(self, since, until=None):
+        commits = self.history
+        if since:
+            since = parse_date(since)
+            commits = [commit for commit in commits if parse_date(commit["date"]) >= since]
+        if until:
+            until = parse_date(until)
+            commits = [commit for commit in commits if parse_date(commit["date"]) <= until]
+        return commits
+
+    def count(self, resource):
+        """Counts a request against the rate limits.
+
+        Returns (status, headers, message): status is None unless the request is refused.
+        """
+        with self._lock:
+            self.requests += 1
+            n = self.requests
+            limit = self.rate_limit or 10 ** 9
+            remaining, reset = self.budgets.get(resource, (limit, time.time() + self.rate_window))
+            if time.time() >= reset:
+                remaining, reset = limit, time.time() + self.rate_window
+            if remaining > 0:
+                remaining -= 1
+                refused = False
+            else:
+                refused = True
+            self.budgets[resource] = (remaining, reset)
+
+        headers = {
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": str(int(reset)),
+            "X-RateLimit-Resource": resource,
+        }
+        if refused:
+            return 403, headers, "API rate limit exceeded"
+        if self.secondary_every and n % self.secondary_every == 0:
+            return 403, {**headers, "Retry-After": "1"}, "You have exceeded a secondary rate limit"
+        return None, headers, None
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    "Routes requests to the FakeGitHub in `github`"
+    protocol_version = "HTTP/1.1"
+    github = None
+
+    ROUTES = [
+        ("GET", r"/orgs/(?P<org>[^/]+)", "get_org"),
+        ("GET", r"/orgs/(?P<org>[^/]+)/repos", "list_repos"),
+        ("GET", r"/repos/(?P<org>[^/]+)/(?P<name>[^/]+)", "get_repo"),
+        ("DELETE", r"/repos/(?P<org>[^/]+)/(?P<name>[^/]+)", "delete_repo"),
+        ("POST", r"/repos/(?P<org>[^/]+)/(?P<name>[^/]+)/generate", "generate_repo"),
+        ("GET", r"/repos/(?P<org>[^/]+)/(?P<name>[^/]+)/collaborators/(?P<user>[^/]+)", "is_collaborator"),
+        ("PUT", r"/repos/(?P<org>[^/]+)/(?P<name>[^/]+)/collaborators/(?P<user>[^/]+)", "add_collaborator"),
+        ("GET", r"/repos/(?P<org>[^/]+)/(?P<name>[^/]+)/commits", "list_commits"),
+        ("GET", r"/repos/(?P<org>[^/]+)/(?P<name>[^/]+)/commits/(?P<sha>[0-9a-f]+)", "get_commit"),
+        ("POST", r"/graphql", "graphql"),
+    ]
+
+    def setup(self):
+        super().setup()
+        # headers and body go out in separate writes; without this each
+        # keep-alive request waits on a delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_POST(self):
+        self.route("POST")
+
+    def do_PUT(self):
+        self.route("PUT")
+
+    def do_DELETE(self):
+        self.route("DELETE")
+
+    def route(self, method):
+        url = urlparse(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        self.body = json.loads(body) if body else None
+
+        if self.github.latency:
+            time.sleep(self.github.latency)
+
+        resource = "graphql" if url.path == "/graphql" else "core"
+        status, self.rate_headers, message = self.github.count(resource)
+        if status:
+            return self.reply(status, {"message": message})
+
+        for route_method, pattern, handler in self.ROUTES:
+            match = re.fullmatch(pattern, url.path)
+            if match and route_method == method:
+                return getattr(self, handler)(**match.groupdict())
+        self.reply(404, {"message": "Not Found"})
+
+    def reply(self, status, data=None, headers=None):
+        body = json.dumps(data).encode() if data is not None else b""
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if self.command == "GET" and status == 200 and self.headers.get("If-None-Match") == etag:
+            status, body = 304, b""
+
+        self.send_response(status)
+        for key, value in {**self.rate_headers, **(headers or {})}.items():
+            self.send_header(key, value)
+        if self.command == "GET":
+            self.send_header("ETag", etag)
+        if body:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def paged(self, path, items):
+        "Replies with the page of `items` asked for, with GitHub's Link header"
+        per_page = int(self.query.get("per_page", 30))
+        page = int(self.query.get("page", 1))
+        last = max(-(-len(items) // per_page), 1)
+
+        links = []
+        params = {key: value for key, value in self.query.items() if key != "page"}
+        query = "".join(f"&{urlencode({key: value})}" for key, value in params.items())
+        if page < last:
+            links.append(f'<{self.github.url}{path}?page={page + 1}{query}>; rel="next"')
+            links.append(f'<{self.github.url}{path}?page={last}{query}>; rel="last"')
+        headers = {"Link": ", ".join(links)} if links else {}
+        self.reply(200, items[(page - 1) * per_page:page * per_page], headers)
+
+    def known(self, org, name):
+        return org == self.github.org and name in self.github.repos
+
+    def get_org(self, org):
+        if org != self.github.org:
+            return self.reply(404, {"message": "Not Found"})
+        self.reply(200, {"login": org, "url": f"{self.github.url}/orgs/{org}", "type": "Organization"})
+
+    def list_repos(self, org):
+        names = sorted(self.github.repos)
+        self.paged(f"/orgs/{org}/repos", [self.github.repo_json(name) for name in names])
+
+    def get_repo(self, org, name):
+        if not self.known(org, name):
+            return self.reply(404, {"message": "Not Found"})
+        self.reply(200, self.github.repo_json(name))
+
+    def delete_repo(self, org, name):
+        if not self.known(org, name):
+            return self.reply(404, {"message": "Not Found"})
+        with self.github._lock:
+            del self.github.repos[name]
+        self.reply(204)
+
+    def generate_repo(self, org, name):
+        new_name = self.body["name"]
+        if not self.known(org, name):
+            return self.reply(404, {"message": "Not Found"})
+        if new_name in self.github.repos:
+            return self.reply(422, {"message": "Repository creation failed.", "errors": ["name already exists on this account"]})
+        with self.github._lock:
+            self.github.repos[new_name] = self.github.new_repo()
+        self.reply(201, self.github.repo_json(new_name))
+
+    def is_collaborator(self, org, name, user):
+        if self.known(org, name) and user in self.github.repos[name]["collaborators"]:
+            return self.reply(204)
+        self.reply(404, {"message": "Not Found"})
+
+    def add_collaborator(self, org, name, user):
+        if not self.known(org, name):
+            return self.reply(404, {"message": "Not Found"})
+        self.github.repos[name]["collaborators"].add(user)
+        self.reply(201, {"id": 1, "permissions": (self.body or {}).get("permission", "push")})
+
+    def list_commits(self, org, name):
+        if not self.known(org, name):
+            return self.reply(404, {"message": "Not Found"})
+        commits = self.github.history_since(self.query.get("since"))
+        self.paged(f"/repos/{org}/{name}/commits", [self.github.commit_json(name, commit) for commit in commits])
+
+    def get_commit(self, org, name, sha):
+        commit = next((commit for commit in self.github.history if commit["sha"] == sha), None)
+        if not self.known(org, name) or commit is None:
+            return self.reply(404, {"message": "Not Found"})
+        self.reply(200, self.github.commit_json(name, commit, stats=True))
+
+    def graphql(self):
+        """Answers the aliased `repository(owner: $owner, name: $rN)` queries
+        that github_graphql sends, one alias per variable rN.
+        """
+        variables = self.body.get("variables") or {}
+        org = variables.get("owner")
+        data, errors = {}, []
+        for alias, name in variables.items():
+            if not re.fullmatch(r"r\d+", alias):
+                continue
+            if not self.known(org, name):
+                data[alias] = None
+                errors.append({"type": "NOT_FOUND", "path": [alias], "message": f"Could not resolve to a Repository with the name '{org}/{name}'."})
+                continue
+            data[alias] = {"defaultBranchRef": {"target": self.history_page(variables)}}
+        self.reply(200, {"data": data, **({"errors": errors} if errors else {})})
+
+    def history_page(self, variables):
+        commits = self.github.history_since(variables.get("since"), variables.get("until"))
+        start = int(variables.get("cursor") or 0)
+        page = commits[start:start + 100]
+        return {
+            "history": {
+                "totalCount": len(commits),
+                "pageInfo": {"hasNextPage": start + 100 < len(commits), "endCursor": str(start + 100)},
+                "nodes": [
+                    {
+                        "oid": commit["sha"],
+                        "message": commit["message"],
+                        "additions": commit["additions"],
+                        "deletions": commit["deletions"],
+                        "author": {"date": commit["author_date"]},
+                        "committedDate": commit["date"],
+                    }
+                    for commit in page
+                ],
+            }
+        }
+
+
+def now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def parse_date(text):
+    return datetime.fromisoformat(text.replace("Z", "+00:00"))
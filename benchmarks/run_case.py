@@ -0,0 +1,73 @@
+#run_case.py
+
+# Runs one repo_management command against the fake GitHub server and writes
+# its timings, and how many students it failed, to a JSON file. bench.py starts this in a fresh process for every
+# case, so each one's peak memory is its own.
+
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss_mb(who):
+    "Peak resident memory in MB; ru_maxrss is in bytes on macOS and kilobytes elsewhere"
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10
+
+
+def configure(work, api, rate, org, course):
+    "Points settings at the benchmark's work directory and fake server, before anything reads them"
+    sys.path[:0] = [work, REPO]
+    import settings as s
+    s.CLONE_DIRECTORY = f"{work}/clones"
+    s.ROSTER_FILE = f"{work}/roster.csv"
+    s.ROSTER_CACHE = f"{work}/.repoview/roster.pickle"
+    s.CACHE_FILE = f"{work}/.repoview/http_cache.sqlite"
+    s.STATE_FILE = f"{work}/.repoview/state.sqlite"
+    s.INDEX_DIRECTORY = f"{work}/.repoview/index"
+    s.GRADED_DIRECTORY = f"{work}/graded"
+    s.COMMIT_STORE = f"{work}/.repoview/commits.sqlite"
+    s.JOURNAL_DIRECTORY = f"{work}/.repoview/journal"
+    s.COURSES = {course: {"org": org, "directory": course}}
+    s.GITHUB_API_URL = api
+    if rate:
+        s.REQUESTS_PER_SECOND = rate
+    else:
+        s.REQUESTS_PER_SECOND = s.REQUEST_BURST = 10 ** 6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one benchmark case")
+    parser.add_argument("--work", required=True)
+    parser.add_argument("--api", required=True)
+    parser.add_argument("--org", required=True)
+    parser.add_argument("--course", required=True)
+    parser.add_argument("--rate", type=float)
+    parser.add_argument("--result", required=True)
+    parser.add_argument("command", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    configure(args.work, args.api, args.rate, args.org, args.course)
+    import repo_management
+
+    sys.argv = ["repo_management.py", *args.command]
+    start = time.perf_counter()
+    failed = repo_management.main()
+    seconds = time.perf_counter() - start
+
+    with open(args.result, "w") as file:
+        json.dump({
+            "seconds": seconds,
+            "failed": failed or 0,
+            "rss_mb": peak_rss_mb(resource.RUSAGE_SELF),
+            "git_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+        }, file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#startup.py
+
+# Checks that the CLI starts quickly: times `--help` and a `pull` with no
+# token, and lists the slowest imports of each command from
+# `python -X importtime`. Fails if a command that doesn't talk to GitHub
+# imports PyGithub, requests, pandas or pytz, or takes longer than the budget.
+#
+#   python benchmarks/startup.py
+#   python benchmarks/startup.py --budget-ms 150 --top 10
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import settings as s
+
+# commands that should start without any GitHub machinery; `pull` is added
+# by pull_command, since it needs a roster
+COMMANDS = {
+    "--help": ["repo_management.py", "--help"],
+    "import": ["-c", "import repo_management"],
+}
+
+# commands whose wall time must stay within the budget
+TIMED = ["--help", "pull"]
+
+# modules that only GitHub modes (or none at all) may import
+HEAVY = ["github", "requests", "urllib3", "jwt", "cryptography", "pandas", "pyarrow", "pytz", "tqdm"]
+
+
+def import_times(command):
+    """Runs `command` under `python -X importtime`.
+
+    Returns a dict mapping each imported module to (cumulative ms, depth),
+    where depth 0 is a module the program imported itself.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", *command], cwd=REPO, capture_output=True, text=True)
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line.split("|")
+        if cumulative.strip().isdigit():
+            depth = (len(module) - len(module.lstrip()) - 1) // 2
+            times[module.strip()] = (int(cumulative) / 1000, depth)
+    return times
+
+
+def pull_command(work):
+    """A `pull` of one student's lab, run as if secret.py had no token, with
+    the clone directory, roster and state in `work` instead of the real ones.
+    """
+    course = next(iter(s.COURSES))
+    roster = os.path.join(work, "roster.csv")
+    with open(roster, "w") as file:
+        file.write(f"{course},startup-check\n")
+    argv = ["repo_management.py", "pull", "--course", course, "--lab", "startup_check", "--csv", roster]
+    return ["-c", "; ".join([
+        "import runpy, sys, settings as s",
+        "sys.modules['secret'] = None",
+        f"s.CLONE_DIRECTORY = {work!r}",
+        f"s.ROSTER_CACHE = {os.path.join(work, 'roster.pickle')!r}",
+        f"s.STATE_FILE = {os.path.join(work, 'state.sqlite')!r}",
+        f"sys.argv = {argv!r}",
+        "runpy.run_path('repo_management.py', run_name='__main__')",
+    ])]
+
+
+def wall_ms(command, runs):
+    "Median wall time in ms of running `command` with the interpreter"
+    command = [sys.executable, *command]
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=REPO, capture_output=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def baseline_ms(runs):
+    "Median wall time in ms of starting the interpreter and doing nothing"
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], capture_output=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check how quickly repo_management.py starts")
+    parser.add_argument("--runs", type=int, default=10, help="Runs to take the median of")
+    parser.add_argument("--top", type=int, default=5, help="Slowest imports to list")
+    parser.add_argument("--budget-ms", type=float, default=100, help="Most ms `--help` and `pull` may take beyond bare interpreter startup")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as work:
+        check(args, {**COMMANDS, "pull": pull_command(work)})
+
+
+def check(args, commands):
+    # the interpreter's own startup imports, which no change here affects
+    startup = import_times(["-c", "pass"])
+
+    failures = []
+    for name, command in commands.items():
+        times = {module: t for module, t in import_times(command).items() if module not in startup}
+        total = sum(ms for ms, depth in times.values() if depth == 0)
+        heavy = sorted(module for module in times if module.split(".")[0] in HEAVY)
+
+        print(f"{s.CYAN}{name}: {total:.1f} ms of imports{s.RESET}")
+        for module, (ms, depth) in sorted(times.items(), key=lambda item: -item[1][0])[:args.top]:
+            print(f"  {ms:8.1f} ms  {module}")
+        if heavy:
+            failures.append(f"{name} imports {', '.join(sorted({m.split('.')[0] for m in heavy}))}")
+
+    interpreter = baseline_ms(args.runs)
+    print()
+    for name in TIMED:
+        ms = wall_ms(commands[name], args.runs)
+        print(f"{s.CYAN}{name}: {ms:.0f} ms ({ms - interpreter:.0f} ms beyond the {interpreter:.0f} ms interpreter startup){s.RESET}")
+        if ms - interpreter > args.budget_ms:
+            failures.append(f"{name} took {ms - interpreter:.0f} ms beyond startup; the budget is {args.budget_ms:.0f} ms")
+
+    print()
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("Startup is within budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#commit_store.py
+
+import os
+import sqlite3
+import threading
+from output import CommitWriter
+import settings as s
+
+
+def table_name(course, lab):
+    "Each lab of each course has its own table, named e.g. 'mwc/lab_database'"
+    return f"{course}/{lab}"
+
+
+def quoted(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class CommitStore:
+    """Keeps the commits `log` reads, stored in SQLite with one table per
+    course and lab, so `analyze` can work on them later without asking GitHub
+    again. A commit that is read again replaces its earlier row, so
+    `log --since-last` adds to what earlier runs stored.
+
+    Dates are stored as Unix seconds, which pandas converts in one vectorized
+    step. Every lab of a run writes through the store's one connection. Each
+    student's rows are committed as soon as they are written, before `log`
+    records the repo's new head, so a run that stops partway never leaves
+    commits marked as seen that were not stored. The database is in WAL mode
+    with synchronous=NORMAL, so those commits don't wait for the disk.
+
+    Args:
+        path (string): location of the SQLite file
+    """
+    def __init__(self, path=s.COMMIT_STORE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.writers = []
+        self._lock = threading.Lock()
+
+    def writer(self, course, lab, sections=None):
+        "Returns a CommitWriter which stores a lab's commits"
+        table = quoted(table_name(course, lab))
+        with self._lock:
+            self.db.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    student TEXT,
+                    section TEXT,
+                    sha TEXT,
+                    date INTEGER,
+                    additions INTEGER,
+                    deletions INTEGER,
+                    message TEXT,
+                    PRIMARY KEY (student, sha)
+                )
+            """)
+        writer = StoredCommits(self, table, lab, sections)
+        self.writers.append(writer)
+        return writer
+
+    def insert(self, table, rows):
+        with self._lock:
+            self.db.executemany(f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.commit()
+
+    def close(self):
+        with self._lock:
+            self.db.commit()
+            self.db.close()
+        print(f"Stored {sum(writer.rows for writer in self.writers)} commits for analyze.")
+
+
+class StoredCommits(CommitWriter):
+    "Writes one lab's commits to its table in a CommitStore"
+    def __init__(self, store, table, lab, sections=None):
+        super().__init__(store.path, lab, sections)
+        self.store = store
+        self.table = table
+
+    def write_rows(self, rows):
+        self.store.insert(self.table, [
+            (row["student"], row["section"], row["sha"], int(row["date"].timestamp()), row["additions"], row["deletions"], row["message"])
+            for row in rows
+        ])
+
+    def close(self):
+        "The store's connection is closed by the store"
+
+
+def stored_labs(course, path=s.COMMIT_STORE):
+    "Returns the labs of a course that have stored commits, sorted by name"
+    if not os.path.exists(path):
+        return []
+    db = sqlite3.connect(path)
+    try:
+        names = db.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+    finally:
+        db.close()
+    prefix = table_name(course, "")
+    return sorted(name[len(prefix):] for name, in names if name.startswith(prefix))
+
+
+def load_commits(course, labs, columns=("student", "date", "additions", "deletions"), path=s.COMMIT_STORE):
+    """Reads the stored commits of some labs of a course into one pandas
+    DataFrame, with a `lab` column and `date` as HKT datetimes.
+
+    Args:
+        course (string): course code from the roster
+        labs (list): lab template names; labs with nothing stored are left out
+        columns (list): the stored columns to read; reading fewer is faster
+        path (string): location of the SQLite file
+    """
+    import pandas as pd
+    stored = set(stored_labs(course, path))
+    frames = []
+    db = sqlite3.connect(path) if stored else None
+    try:
+        for lab in labs:
+            if lab not in stored:
+                continue
+            frame = pd.read_sql_query(f"SELECT {', '.join(columns)} FROM {quoted(table_name(course, lab))}", db)
+            frame["lab"] = lab
+            frames.append(frame)
+    finally:
+        if db:
+            db.close()
+
+    if not frames:
+        return pd.DataFrame(columns=[*columns, "lab"])
+    commits = pd.concat(frames, ignore_index=True)
+    if "date" in commits:
+        commits["date"] = pd.to_datetime(commits["date"], unit="s", utc=True).dt.tz_convert("Asia/Hong_Kong")
+    return commits
@@ -0,0 +1,10 @@
+#commits.py
+
+from collections import namedtuple
+from zoneinfo import ZoneInfo
+
+# Define the Hong Kong timezone
+hkt_tz = ZoneInfo('Asia/Hong_Kong')
+
+# One commit of a student repo, however it was read (REST, GraphQL or a local clone)
+CommitRecord = namedtuple("CommitRecord", ["sha", "date", "additions", "deletions", "message"])
@@ -0,0 +1,243 @@
+#github_graphql.py
+
+from datetime import datetime
+from github import GithubException
+from commits import CommitRecord
+from timings import phase
+import settings as s
+
+HISTORY_FIELDS = """
+    defaultBranchRef {
+      target {
+        ... on Commit {
+          history(first: 100, after: $cursor, since: $since) {
+            totalCount
+            pageInfo { hasNextPage endCursor }
+            nodes { oid message additions deletions author { date } }
+          }
+        }
+      }
+    }
+"""
+
+# the head of the default branch, and how many commits lead up to it
+LATEST_FIELDS = """
+    defaultBranchRef {
+      target {
+        ... on Commit {
+          history(first: 1) {
+            totalCount
+            nodes { oid message additions deletions author { date } }
+          }
+        }
+      }
+    }
+"""
+
+# the newest commit at or before $until
+HEAD_BEFORE_FIELDS = """
+    defaultBranchRef {
+      target {
+        ... on Commit {
+          history(first: 1, until: $until) {
+            nodes { oid committedDate }
+          }
+        }
+      }
+    }
+"""
+
+
+def batched(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def query(session, text, variables):
+    """Sends a GraphQL query through the session's client.
+
+    Unlike Requester.graphql_query, a response carrying errors for some of
+    its aliases (e.g. a repo that doesn't exist) still returns the data for
+    the others.
+
+    Returns:
+        (data, errors) where errors are those other than a missing repo, such
+        as a timeout or a node limit, which GitHub returns with status 200
+    """
+    requester = session.github.requester
+    with phase("graphql query"):
+        headers, data = requester.requestJsonAndCheck(
+            "POST", requester.graphql_url, input={"query": text, "variables": variables}
+        )
+    errors = [error for error in data.get("errors") or [] if error.get("type") != "NOT_FOUND"]
+    return data.get("data") or {}, errors
+
+
+def describe(errors):
+    "Each distinct GraphQL error message once, with how many times it occurred"
+    counts = {}
+    for error in errors:
+        message = error.get("message", "unknown error")
+        counts[message] = counts.get(message, 0) + 1
+    return "; ".join(f"{message} ({count} times)" if count > 1 else message for message, count in counts.items())
+
+
+def query_repos(session, repo_names, fields, variables=None, declarations=""):
+    """Looks up `fields` on many repos of the session's organization, with one
+    aliased query per s.GRAPHQL_BATCH_SIZE repos.
+
+    Args:
+        session (GitHubSession): the run's session
+        repo_names (list): names of repos in the organization
+        fields (string): GraphQL selection applied to each repository
+        variables (dict): extra variables used by `fields`
+        declarations (string): GraphQL declarations for the extra variables
+
+    Returns:
+        A dict mapping each repo name to its repository data, or to None when
+        the repo could not be read.
+    """
+    results = {}
+    for batch in batched(list(repo_names), s.GRAPHQL_BATCH_SIZE):
+        results.update(query_batch(session, batch, fields, variables, declarations))
+    return results
+
+
+def query_batch(session, batch, fields, variables, declarations):
+    """Looks up `fields` on a batch of repos with one aliased query.
+
+    A batch that fails as a whole, e.g. from a timeout or a node limit, is
+    retried in halves down to single repos, so that only the repos that
+    can't be read on their own are marked None.
+    """
+    params = ", ".join(f"$r{i}: String!" for i in range(len(batch)))
+    aliases = "\n".join(
+        f"  r{i}: repository(owner: $owner, name: $r{i}) {{{fields}}}" for i in range(len(batch))
+    )
+    text = f"query($owner: String!, {params}{declarations}) {{\n{aliases}\n}}"
+    batch_variables = {"owner": session.org_name, **(variables or {})}
+    batch_variables.update({f"r{i}": name for i, name in enumerate(batch)})
+
+    try:
+        data, errors = query(session, text, batch_variables)
+    except GithubException as e:
+        data, errors = {}, [{"message": str(e)}]
+
+    results = {name: data.get(f"r{i}") for i, name in enumerate(batch)}
+    # without errors other than NOT_FOUND, a repo left without data doesn't exist
+    unread = [name for name, repository in results.items() if repository is None] if errors else []
+    if not unread:
+        return results
+
+    if len(batch) == 1:
+        print(f"GraphQL query failed for '{batch[0]}': {describe(errors)}")
+        return results
+    print(f"GraphQL query failed for {len(unread)} repos ({describe(errors)}); retrying them in halves.")
+    half = (len(unread) + 1) // 2
+    for part in (unread[:half], unread[half:]):
+        if part:
+            results.update(query_batch(session, part, fields, variables, declarations))
+    return results
+
+
+def parse_date(text):
+    return datetime.fromisoformat(text.replace("Z", "+00:00"))
+
+
+def commit_records(history):
+    return [
+        CommitRecord(
+            node["oid"],
+            parse_date(node["author"]["date"]),
+            node["additions"],
+            node["deletions"],
+            node["message"],
+        )
+        for node in history["nodes"]
+    ]
+
+
+def history_of(repository):
+    branch = repository.get("defaultBranchRef") if repository else None
+    return branch["target"]["history"] if branch else None
+
+
+def get_repo_logs(session, repo_names, since=None):
+    """Fetches the default-branch history of many repos, with additions and
+    deletions for each commit. When `since` (an ISO 8601 timestamp) is given,
+    only commits made after it are fetched.
+
+    Returns:
+        A dict mapping each repo name to its list of CommitRecords, newest
+        first, or to None when the repo could not be read.
+    """
+    declarations = ", $cursor: String, $since: GitTimestamp"
+    repositories = query_repos(session, repo_names, HISTORY_FIELDS, {"cursor": None, "since": since}, declarations)
+
+    logs = {}
+    for name, repository in repositories.items():
+        if repository is None:
+            logs[name] = None
+            continue
+        history = history_of(repository)
+        if history is None:
+            logs[name] = []
+            continue
+        commits = commit_records(history)
+
+        # Repos with more than 100 commits page through the rest on their own.
+        while history["pageInfo"]["hasNextPage"]:
+            page = query_repos(session, [name], HISTORY_FIELDS,
+                {"cursor": history["pageInfo"]["endCursor"], "since": since}, declarations)
+            history = history_of(page[name])
+            if history is None:
+                break
+            commits.extend(commit_records(history))
+        logs[name] = commits
+    return logs
+
+
+def get_heads_before(session, repo_names, until):
+    """Finds the newest default-branch commit of many repos made at or before
+    `until` (an ISO 8601 timestamp), one aliased query per batch of repos.
+
+    Returns:
+        A dict mapping each repo name to (sha, date) of that commit, to
+        (None, None) when the repo has no commit that old, or to None when the
+        repo could not be read.
+    """
+    repositories = query_repos(session, repo_names, HEAD_BEFORE_FIELDS, {"until": until}, ", $until: GitTimestamp")
+
+    heads = {}
+    for name, repository in repositories.items():
+        if repository is None:
+            heads[name] = None
+            continue
+        history = history_of(repository)
+        nodes = history["nodes"] if history else []
+        heads[name] = (nodes[0]["oid"], parse_date(nodes[0]["committedDate"])) if nodes else (None, None)
+    return heads
+
+
+def get_latest_commits(session, repo_names):
+    """Finds the head of the default branch of many repos, one aliased query
+    per batch of repos.
+
+    Returns:
+        A dict mapping each repo name to (CommitRecord of the head, number of
+        commits), to (None, 0) when the repo has no commits, or to None when
+        the repo could not be read.
+    """
+    repositories = query_repos(session, repo_names, LATEST_FIELDS)
+
+    latest = {}
+    for name, repository in repositories.items():
+        if repository is None:
+            latest[name] = None
+            continue
+        history = history_of(repository)
+        if history is None or not history["nodes"]:
+            latest[name] = (None, 0)
+            continue
+        latest[name] = (commit_records(history)[0], history["totalCount"])
+    return latest
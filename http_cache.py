@@ -0,0 +1,156 @@
+#http_cache.py
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+import json
+import os
+import sqlite3
+import threading
+import time
+import settings as s
+
+# headers which describe the stored body rather than the response as a whole
+BODY_HEADERS = ("content-length", "content-encoding", "transfer-encoding")
+
+
+class ResponseCache:
+    """Persistent cache of GitHub GET responses, stored in SQLite.
+
+    Cached responses are revalidated with If-None-Match / If-Modified-Since.
+    GitHub answers 304 Not Modified when nothing changed, and 304s don't count
+    against the rate limit, so repeated runs only pay for what changed.
+
+    Writes are committed together every `commit_seconds` and on close rather
+    than one by one, since workers wait on the cache's lock while it commits.
+    The database is in WAL mode with synchronous=NORMAL, so a commit doesn't
+    wait for the disk; a crash loses at most the last few entries, which are
+    only fetched again.
+
+    Args:
+        path (string): location of the SQLite file
+        max_mb (int): entries are evicted, least recently used first, above this size
+        max_age_days (int): entries not used for this long are evicted
+        commit_seconds (float): most time between commits
+    """
+    def __init__(self, path=s.CACHE_FILE, max_mb=s.CACHE_MAX_MB, max_age_days=s.CACHE_MAX_AGE_DAYS, commit_seconds=s.CACHE_COMMIT_SECONDS):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_age = max_age_days * 24 * 60 * 60
+        self.hits = 0
+        self.misses = 0
+        self.commit_seconds = commit_seconds
+        self.committed = time.monotonic()
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                headers TEXT,
+                body BLOB,
+                size INTEGER,
+                used_at REAL
+            )
+        """)
+        self.evict()
+
+    @staticmethod
+    def key(request):
+        return f"{request.headers.get('Accept', '')} {request.url}"
+
+    def lookup(self, request):
+        "Adds conditional headers to a GET request that has a cached response; returns the cache key"
+        if request.method != "GET":
+            return None
+        key = self.key(request)
+        with self._lock:
+            row = self.db.execute(
+                "SELECT etag, last_modified FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row:
+            etag, last_modified = row
+            if etag:
+                request.headers["If-None-Match"] = etag
+            if last_modified:
+                request.headers["If-Modified-Since"] = last_modified
+        return key
+
+    def update(self, key, request, response):
+        """Returns the response to hand back to PyGithub: the cached one when
+        GitHub answered 304, otherwise `response`, which is stored if it can be
+        revalidated later.
+        """
+        if response.status_code == 304:
+            response.content  # reads the empty body so the connection goes back to the pool
+            with self._lock:
+                row = self.db.execute(
+                    "SELECT headers, body FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row:
+                    self.hits += 1
+                    self.db.execute("UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key))
+                    self.commit_every()
+            if row:
+                return cached_response(request, response, json.loads(row[0]), row[1])
+            return response
+
+        with self._lock:
+            self.misses += 1
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code == 200 and (etag or last_modified):
+            headers = {k: v for k, v in response.headers.items() if k.lower() not in BODY_HEADERS}
+            body = response.content
+            with self._lock:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, etag, last_modified, json.dumps(headers), body, len(body), time.time()),
+                )
+                self.commit_every()
+        return response
+
+    def commit_every(self):
+        "Commits if the last commit was more than commit_seconds ago; call with the lock held"
+        if time.monotonic() - self.committed >= self.commit_seconds:
+            self.db.commit()
+            self.committed = time.monotonic()
+
+    def evict(self):
+        "Drops stale entries, then the least recently used ones until the cache fits in max_mb"
+        with self._lock:
+            self.db.execute("DELETE FROM responses WHERE used_at < ?", (time.time() - self.max_age,))
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                freed = 0
+                stale = []
+                for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY used_at"):
+                    if total - freed <= self.max_bytes:
+                        break
+                    stale.append((key,))
+                    freed += size
+                self.db.executemany("DELETE FROM responses WHERE key = ?", stale)
+            self.db.commit()
+
+    def report(self):
+        print(f"{s.CYAN}HTTP cache: {self.hits} hits, {self.misses} misses.{s.RESET}")
+
+    def close(self):
+        self.evict()
+        self.db.close()
+
+
+def cached_response(request, not_modified, headers, body):
+    "Builds a 200 response from a cached entry, with the fresh headers of the 304 on top"
+    response = Response()
+    response.status_code = 200
+    response.reason = "OK"
+    response.headers = CaseInsensitiveDict(headers)
+    response.headers.update({k: v for k, v in not_modified.headers.items() if k.lower() not in BODY_HEADERS})
+    response._content = body
+    response.url = request.url
+    response.request = request
+    response.encoding = "utf-8"
+    return response
@@ -0,0 +1,111 @@
+#journal.py
+
+from datetime import datetime
+import json
+import os
+import threading
+import time
+from commits import hkt_tz
+import settings as s
+
+
+def journal_file(course, lab, mode, directory=s.JOURNAL_DIRECTORY):
+    "Each course, lab and mode has its own journal, e.g. 'mwc_lab_database_create.jsonl'"
+    return f"{directory}/{course}_{lab}_{mode}.jsonl"
+
+
+def finished(path):
+    "Returns the students whose latest entry in the journal at `path` succeeded"
+    if not os.path.exists(path):
+        return set()
+    last = {}
+    with open(path) as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # a line cut short when the machine went down
+                continue
+            last[entry["student"]] = entry["ok"]
+    return {student for student, ok in last.items() if ok}
+
+
+class Journal:
+    """Append-only record of the students a run has finished, one JSON line
+    each, so `--resume` can skip them after the run dies halfway.
+
+    Each line is flushed to the OS as soon as its student finishes, so it
+    survives the process being killed. fsync, which waits for the disk, runs
+    at most once every `fsync_seconds` and when the journal is closed, so
+    only a machine crash can lose the last few lines. The file is opened on
+    the first line, so a run that does nothing (a dry run, a cancelled
+    delete) leaves the previous journal alone.
+
+    Args:
+        path (string): the journal file
+        resume (bool): add to the existing journal instead of starting a new one
+        fsync_seconds (float): most time between fsyncs
+    """
+    def __init__(self, path, resume=False, fsync_seconds=s.JOURNAL_FSYNC_SECONDS):
+        self.path = path
+        self.resume = resume
+        self.fsync_seconds = fsync_seconds
+        self.file = None
+        self.synced = time.monotonic()
+        self._lock = threading.Lock()
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, "a" if self.resume else "w")
+        # start on a new line if the journal ends with a line cut short
+        if self.file.tell() > 0:
+            with open(self.path, "rb") as file:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b"\n":
+                    self.file.write("\n")
+
+    def record(self, student, ok, seconds):
+        "Adds a finished student"
+        line = json.dumps({
+            "student": student,
+            "ok": ok,
+            "seconds": round(seconds, 3),
+            "at": datetime.now(hkt_tz).isoformat(),
+        })
+        with self._lock:
+            if self.file is None:
+                self.open()
+            self.file.write(line + "\n")
+            self.file.flush()
+            if time.monotonic() - self.synced >= self.fsync_seconds:
+                os.fsync(self.file.fileno())
+                self.synced = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self.file is not None:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+                self.file = None
+
+
+class Journals:
+    """The journals of every lab in a run that covers several. Each finished
+    task is recorded in the journal of its own course and lab.
+
+    Args:
+        journals (dict): maps each (course, lab) to its Journal
+        tasks (dict): maps each name run_students is given to its Task
+    """
+    def __init__(self, journals, tasks):
+        self.journals = journals
+        self.tasks = tasks
+
+    def record(self, name, ok, seconds):
+        task = self.tasks[name]
+        self.journals[(task.course, task.lab)].record(task.student, ok, seconds)
+
+    def close(self):
+        for journal in self.journals.values():
+            journal.close()
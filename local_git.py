@@ -0,0 +1,295 @@
+#local_git.py
+
+from collections import namedtuple
+from datetime import datetime
+from commits import CommitRecord
+from timings import phase
+from runner import run_parallel
+import os
+import shutil
+import subprocess
+import tarfile
+
+PullResult = namedtuple("PullResult", ["name", "status", "sha", "detail"])
+SnapshotResult = namedtuple("SnapshotResult", ["name", "status", "sha", "date", "detail"])
+
+# the statuses of a pull or snapshot that succeeded
+PULLED = ("updated", "up to date")
+SNAPSHOTTED = ("exported", "unchanged")
+
+# never stop a worker to ask for credentials; fail that repo instead
+GIT_ENV = {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+
+
+def git(path, *args, check=True):
+    """Runs a git command against the repo at `path` without changing directory.
+
+    Returns the completed process; raises subprocess.CalledProcessError when
+    `check` is set and git fails.
+    """
+    with phase(f"git {args[0]}", repo=os.path.basename(path)):
+        return subprocess.run(
+            ["git", "-C", path, *args],
+            check=check,
+            capture_output=True,
+            text=True,
+            env=GIT_ENV,
+        )
+
+
+def head_sha(path):
+    "Returns the sha HEAD points to, or None for an empty repo"
+    result = git(path, "rev-parse", "--verify", "--quiet", "HEAD", check=False)
+    return result.stdout.strip() or None
+
+
+def is_clone(path):
+    "True if `path` is the top of a git working tree"
+    if not os.path.exists(os.path.join(path, '.git')):
+        return False
+    result = git(path, "rev-parse", "--is-inside-work-tree", check=False)
+    return result.returncode == 0 and result.stdout.strip() == "true"
+
+
+def clone_options(depth=None, filter=None, reference=None):
+    """Returns the extra `git clone` arguments for a clone strategy.
+
+    Args:
+        depth (int): only fetch this many commits of history
+        filter (string): partial clone filter, e.g. "blob:none" to fetch file contents on demand
+        reference (string): local repo whose objects are borrowed instead of downloaded
+    """
+    options = []
+    if depth:
+        options += ["--depth", str(depth)]
+    if filter:
+        options += [f"--filter={filter}"]
+    if reference:
+        options += ["--reference-if-able", reference]
+    return options
+
+
+def update_reference(url, path):
+    """Creates or refreshes a bare copy of `url` at `path`, for student clones
+    to share objects with through --reference.
+    """
+    if os.path.isdir(path):
+        git(path, "fetch", "--prune", "origin", "+refs/heads/*:refs/heads/*")
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        subprocess.run(["git", "clone", "--bare", url, path], check=True, capture_output=True, text=True, env=GIT_ENV)
+
+
+def find_repos(base_dir):
+    "Returns the paths of the git repositories directly inside base_dir, sorted by name"
+    return sorted(
+        entry.path for entry in os.scandir(base_dir)
+        if entry.is_dir() and os.path.exists(os.path.join(entry.path, '.git'))
+    )
+
+
+def pull_repo(path):
+    """Pulls the latest changes into the repo at `path`.
+
+    Returns a PullResult whose status is one of "updated", "up to date",
+    "conflict" or "error".
+    """
+    name = os.path.basename(path)
+    try:
+        before = head_sha(path)
+        result = git(path, "pull", check=False)
+        after = head_sha(path)
+    except OSError as e:
+        return PullResult(name, "error", None, str(e))
+
+    output = result.stdout + result.stderr
+    if result.returncode != 0:
+        if "CONFLICT" in output or "divergent branches" in output or "not possible to fast-forward" in output:
+            return PullResult(name, "conflict", after, output.strip())
+        return PullResult(name, "error", after, output.strip())
+    if before != after:
+        return PullResult(name, "updated", after, "")
+    return PullResult(name, "up to date", after, "")
+
+
+def pull_repos(paths, jobs):
+    "Pulls every repo in `paths` across `jobs` git processes; results are in the order given"
+    return run_parallel(paths, pull_repo, jobs, "pull", lambda result: result.status in PULLED)
+
+
+# one record per commit: \x1e, then sha, author date and message separated by \x1f,
+# then a final \x1f followed by the commit's --numstat lines
+LOG_FORMAT = "--format=%x1e%H%x1f%aI%x1f%B%x1f"
+
+
+def repo_log(path, max_count=None):
+    """Reads the history of HEAD in a local clone, with additions and deletions
+    for each commit (merges are compared to their first parent, as GitHub does).
+
+    Args:
+        path (string): the clone
+        max_count (int): only read this many of the newest commits
+
+    Returns a list of CommitRecords, newest first, or None if git fails.
+    """
+    limit = [f"--max-count={max_count}"] if max_count else []
+    result = git(path, "log", *limit, "--numstat", "--diff-merges=first-parent", LOG_FORMAT, check=False)
+    if result.returncode != 0:
+        return None
+
+    commits = []
+    for entry in result.stdout.split("\x1e")[1:]:
+        sha, date, message, numstat = entry.split("\x1f")
+        additions = deletions = 0
+        for line in numstat.strip().splitlines():
+            added, deleted, _ = line.split("\t", 2)
+            # binary files show "-" instead of line counts
+            if added != "-":
+                additions += int(added)
+                deletions += int(deleted)
+        commits.append(CommitRecord(sha, datetime.fromisoformat(date), additions, deletions, message.rstrip("\n")))
+    return commits
+
+
+def repo_logs(paths, jobs):
+    """Reads the history of every clone in `paths` across `jobs` git processes.
+
+    Returns a dict mapping each path to its commits, or to None when there is
+    no readable clone there.
+    """
+    def read(path):
+        return repo_log(path) if os.path.exists(os.path.join(path, '.git')) else None
+
+    return dict(zip(paths, run_parallel(paths, read, jobs, "log", lambda commits: commits is not None)))
+
+
+def latest_commit(path):
+    """Reads the head of a local clone.
+
+    Returns (CommitRecord of HEAD, number of commits on HEAD), (None, 0) for
+    a clone with no commits, or None when there is no readable clone at `path`.
+    """
+    if not os.path.exists(os.path.join(path, '.git')):
+        return None
+    if head_sha(path) is None:
+        return None, 0
+    commits = repo_log(path, max_count=1)
+    count = git(path, "rev-list", "--count", "HEAD", check=False)
+    if not commits or count.returncode != 0:
+        return None
+    return commits[0], int(count.stdout)
+
+
+def latest_commits(paths, jobs):
+    """Reads the head of every clone in `paths` across `jobs` git processes.
+
+    Returns a dict mapping each path to what latest_commit returns for it.
+    """
+    return dict(zip(paths, run_parallel(paths, latest_commit, jobs, "latest", lambda latest: latest is not None)))
+
+
+def commit_before(path, deadline):
+    """Finds the newest commit on HEAD in the clone at `path` committed at or
+    before `deadline` (a timezone-aware datetime).
+
+    Returns (sha, date) of that commit, or (None, None) if there is none,
+    including when the repo has no commits at all.
+    """
+    result = git(path, "log", "-1", f"--before={deadline.isoformat()}", "--format=%H%x1f%cI", "HEAD", check=False)
+    if result.returncode != 0 or not result.stdout.strip():
+        return None, None
+    sha, date = result.stdout.strip().split("\x1f")
+    return sha, datetime.fromisoformat(date)
+
+
+def has_commit(path, sha):
+    "True if the clone at `path` has the commit `sha`"
+    return git(path, "cat-file", "-e", f"{sha}^{{commit}}", check=False).returncode == 0
+
+
+def export_tree(path, sha, dest):
+    """Writes the files of commit `sha` in the clone at `path` to `dest`,
+    replacing whatever was there. Streams `git archive` straight into the
+    directory, so the clone's own checkout is left alone.
+    """
+    if os.path.exists(dest):
+        shutil.rmtree(dest)
+    os.makedirs(dest)
+
+    with phase("git archive", repo=os.path.basename(path)):
+        process = subprocess.Popen(
+            ["git", "-C", path, "archive", "--format=tar", sha],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=GIT_ENV,
+        )
+        try:
+            with tarfile.open(fileobj=process.stdout, mode="r|") as archive:
+                # only regular files and directories inside dest, where Python supports it
+                if hasattr(tarfile, "data_filter"):
+                    archive.extractall(dest, filter="data")
+                else:
+                    archive.extractall(dest)
+        except tarfile.ReadError:
+            # git wrote nothing; its error is reported below
+            if process.wait() == 0:
+                raise
+        finally:
+            process.stdout.close()
+        error = process.stderr.read().decode(errors="replace")
+        process.stderr.close()
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, ["git", "archive", sha], stderr=error)
+
+
+def snapshot_repo(path, dest, deadline, head=None, previous=None):
+    """Exports the clone at `path` as it was at `deadline` to `dest`.
+
+    Args:
+        path (string): the student's clone
+        dest (string): directory the files are written to
+        deadline (datetime): the newest commit at or before this is exported
+        head (tuple): (sha, date) of that commit, when GitHub already said which it is;
+            otherwise it is looked up in the clone. A commit the clone doesn't have yet is fetched.
+        previous (string): sha exported to `dest` by an earlier run, which isn't exported again
+
+    Returns a SnapshotResult whose status is one of "exported", "unchanged",
+    "no commits", "no clone" or "error".
+    """
+    name = os.path.basename(path)
+    if not os.path.exists(os.path.join(path, '.git')):
+        return SnapshotResult(name, "no clone", None, None, f"no clone at '{path}'")
+
+    sha, date = head or (None, None)
+    try:
+        if head is None:
+            sha, date = commit_before(path, deadline)
+        if sha is None:
+            return SnapshotResult(name, "no commits", None, None, "")
+        if sha == previous and os.path.isdir(dest):
+            return SnapshotResult(name, "unchanged", sha, date, "")
+        if not has_commit(path, sha):
+            git(path, "fetch", "--quiet", "origin")
+        export_tree(path, sha, dest)
+    except subprocess.CalledProcessError as e:
+        return SnapshotResult(name, "error", sha, date, (e.stderr or "").strip() or str(e))
+    except (OSError, tarfile.TarError) as e:
+        return SnapshotResult(name, "error", sha, date, str(e))
+    return SnapshotResult(name, "exported", sha, date, "")
+
+
+def snapshot_repos(repos, deadline, jobs):
+    """Exports every repo in `repos` as it was at `deadline`, across `jobs` git processes.
+
+    Args:
+        repos (list): (path, dest, head, previous) for each repo, as taken by snapshot_repo
+        deadline (datetime): the newest commit at or before this is exported
+        jobs (int): number of repos to export at once
+
+    Returns a list of SnapshotResults, in the order given.
+    """
+    def snapshot(repo):
+        path, dest, head, previous = repo
+        return snapshot_repo(path, dest, deadline, head, previous)
+
+    return run_parallel(repos, snapshot, jobs, "snapshot", lambda result: result.status in SNAPSHOTTED)
@@ -0,0 +1,151 @@
+#output.py
+
+from abc import ABC, abstractmethod
+from commits import hkt_tz
+import csv
+import json
+import threading
+
+COLUMNS = ["student", "section", "lab", "sha", "date", "additions", "deletions", "message"]
+
+FORMATS = ["csv", "jsonl", "parquet"]
+
+
+class CommitWriter(ABC):
+    """Writes one row per commit to a file as each student's log comes in,
+    so a whole course never has to sit in memory. Safe to share between
+    worker threads.
+
+    Args:
+        path (string): file to write
+        lab (string): lab name written on every row
+        sections (dict): maps each student to their section
+    """
+    def __init__(self, path, lab, sections=None):
+        self.path = path
+        self.lab = lab
+        self.sections = sections or {}
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def rows_for(self, name, commits):
+        section = self.sections.get(name)
+        for commit in commits:
+            yield {
+                "student": name,
+                "section": section,
+                "lab": self.lab,
+                "sha": commit.sha,
+                "date": commit.date.astimezone(hkt_tz),
+                "additions": commit.additions,
+                "deletions": commit.deletions,
+                "message": commit.message,
+            }
+
+    def write(self, name, commits):
+        "Writes a student's commits"
+        rows = list(self.rows_for(name, commits))
+        with self._lock:
+            self.write_rows(rows)
+            self.rows += len(rows)
+
+    @abstractmethod
+    def write_rows(self, rows):
+        "Writes rows made by rows_for; called with the lock held"
+
+    def close(self):
+        print(f"Wrote {self.rows} commits to '{self.path}'.")
+
+
+class CsvWriter(CommitWriter):
+    def __init__(self, path, lab, sections=None):
+        super().__init__(path, lab, sections)
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.DictWriter(self.file, COLUMNS)
+        self.writer.writeheader()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.writer.writerow({**row, "date": row["date"].isoformat()})
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+class JsonlWriter(CommitWriter):
+    def __init__(self, path, lab, sections=None):
+        super().__init__(path, lab, sections)
+        self.file = open(path, 'w')
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.file.write(json.dumps({**row, "date": row["date"].isoformat()}) + "\n")
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+class ParquetWriter(CommitWriter):
+    """Buffers rows into row groups of `row_group` rows, so memory stays
+    bounded by the row group size rather than the course size.
+    """
+    def __init__(self, path, lab, sections=None, row_group=50_000):
+        super().__init__(path, lab, sections)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet output needs pyarrow. Install it with `pip install pyarrow`.")
+        self.pa = pa
+        self.schema = pa.schema([
+            ("student", pa.string()),
+            ("section", pa.string()),
+            ("lab", pa.string()),
+            ("sha", pa.string()),
+            ("date", pa.timestamp("s", tz="Asia/Hong_Kong")),
+            ("additions", pa.int32()),
+            ("deletions", pa.int32()),
+            ("message", pa.string()),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.row_group = row_group
+        self.buffer = []
+
+    def write_rows(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.row_group:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.writer.write_table(self.pa.Table.from_pylist(self.buffer, self.schema))
+            self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        super().close()
+
+
+class TeeWriter:
+    "Writes each student's commits to several CommitWriters"
+    def __init__(self, writers):
+        self.writers = writers
+
+    def write(self, name, commits):
+        for writer in self.writers:
+            writer.write(name, commits)
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+
+WRITERS = {"csv": CsvWriter, "jsonl": JsonlWriter, "parquet": ParquetWriter}
+
+
+def open_writer(format, path, lab, sections=None):
+    "Returns a CommitWriter for `format` (csv, jsonl or parquet) writing to `path`"
+    return WRITERS[format](path, lab, sections)
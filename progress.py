@@ -0,0 +1,147 @@
+#progress.py
+
+from collections import deque
+import sys
+import threading
+import time
+import settings as s
+
+# set to False by --no-progress
+enabled = True
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "?"
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m{seconds:02d}s" if minutes else f"{seconds}s"
+
+
+class Progress:
+    """Shows how a batch of work is going while it runs: items completed, in
+    flight and failed, GitHub requests per second, and the time left.
+
+    Workers only append to deques (atomic, so no lock per item); one drawing
+    thread reads the counts and redraws every `s.PROGRESS_REDRAW_SECONDS` on a
+    terminal, with tqdm if it is installed. When stderr isn't a terminal, a
+    plain line is printed every `s.PROGRESS_SECONDS` instead.
+
+    Args:
+        total (int): number of items
+        label (string): what is being done, e.g. "clone"
+        requests (function): returns the number of GitHub requests made so far
+        lock (Lock): held while drawing, and by whatever else writes to the terminal
+    """
+    def __init__(self, total, label, requests=None, lock=None):
+        self.total = total
+        self.label = label
+        self.requests = requests
+        self.lock = lock or threading.Lock()
+        self.started = deque()
+        self.finished = deque()
+        self.failed = deque()
+        self.stream = sys.stderr
+        self.tty = self.stream.isatty()
+        self.bar = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.start_time = time.monotonic()
+        self.start_requests = self.requests() if self.requests else 0
+        if self.tty:
+            try:
+                from tqdm import tqdm
+                self.bar = tqdm(total=self.total, desc=self.label, file=self.stream, dynamic_ncols=True, leave=False)
+            except ImportError:
+                pass
+        self.thread = threading.Thread(target=self.draw_every, daemon=True)
+        self.thread.start()
+        return self
+
+    def begin(self):
+        "Called by a worker when it starts an item"
+        self.started.append(1)
+
+    def end(self, ok):
+        "Called by a worker when it finishes an item"
+        self.finished.append(1)
+        if not ok:
+            self.failed.append(1)
+
+    def counts(self):
+        "Returns (completed, in flight, failed, requests per second, seconds left)"
+        done = len(self.finished)
+        elapsed = time.monotonic() - self.start_time
+        rate = (self.requests() - self.start_requests) / elapsed if self.requests and elapsed else None
+        left = (self.total - done) * elapsed / done if done else None
+        return done, len(self.started) - done, len(self.failed), rate, left
+
+    def line(self):
+        done, in_flight, failed, rate, left = self.counts()
+        text = f"{self.label}: {done}/{self.total} done, {in_flight} in flight, {failed} failed"
+        if rate is not None:
+            text += f", {rate:.1f} req/s"
+        return f"{text}, ETA {format_seconds(left)}"
+
+    def draw(self):
+        if self.bar is not None:
+            done, in_flight, failed, rate, left = self.counts()
+            postfix = f"{in_flight} in flight, {failed} failed"
+            if rate is not None:
+                postfix += f", {rate:.1f} req/s"
+            self.bar.n = done
+            self.bar.set_postfix_str(postfix, refresh=False)
+            self.bar.refresh()
+        elif self.tty:
+            self.stream.write(f"\r\x1b[K{self.line()}")
+            self.stream.flush()
+        else:
+            self.stream.write(self.line() + "\n")
+            self.stream.flush()
+
+    def clear(self):
+        "Removes the progress line so other output can be written; it is redrawn on the next tick"
+        if self.bar is not None:
+            self.bar.clear()
+        elif self.tty:
+            self.stream.write("\r\x1b[K")
+
+    def draw_every(self):
+        interval = s.PROGRESS_REDRAW_SECONDS if self.tty else s.PROGRESS_SECONDS
+        while not self.stopped.wait(interval):
+            with self.lock:
+                self.draw()
+
+    def close(self):
+        "Stops drawing; on a terminal the progress line is removed"
+        self.stopped.set()
+        self.thread.join()
+        with self.lock:
+            if self.bar is not None:
+                self.bar.close()
+            elif self.tty:
+                self.clear()
+                self.stream.flush()
+
+
+class NoProgress:
+    "Stands in for Progress when progress is off or there is nothing to show"
+    def begin(self):
+        pass
+
+    def end(self, ok):
+        pass
+
+    def clear(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def show_progress(total, label, requests=None, lock=None):
+    "Returns a started Progress, or a NoProgress when progress is turned off"
+    if not enabled or total == 0:
+        return NoProgress()
+    return Progress(total, label, requests, lock).start()
@@ -0,0 +1,152 @@
+#ratelimit.py
+
+import random
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+import settings as s
+
+
+class RateLimiter:
+    """Paces every request a session sends so a run stays inside GitHub's limits.
+
+    - A token bucket holds the steady request rate to `rate` per second, with
+      bursts of up to `burst` requests, which keeps many workers clear of the
+      secondary rate limits.
+    - The primary budget (X-RateLimit-Remaining/Reset, per resource such as
+      "core" or "graphql") is tracked from every response; when one runs low,
+      that resource's requests are spaced to spread what is left over the
+      time until it resets. Requests of other resources are not slowed.
+    - Requests that change something are also spaced out on their own:
+      deletes by 1/`s.DELETES_PER_SECOND` seconds and other writes by
+      1/`s.WRITES_PER_SECOND`, as GitHub asks of clients.
+    - When GitHub refuses a request anyway, every request waits out the
+      Retry-After (or an exponential backoff), plus jitter so workers don't all
+      resume at once.
+
+    Args:
+        rate (float): most requests per second
+        burst (int): most requests sent back to back
+    """
+    def __init__(self, rate=s.REQUESTS_PER_SECOND, burst=s.REQUEST_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.filled_at = time.monotonic()
+        self.resume_at = 0
+        self.budgets = {}
+        self.intervals = {"delete": 1 / s.DELETES_PER_SECOND, "write": 1 / s.WRITES_PER_SECOND}
+        self.next_write = {}
+        self.next_request = {}
+        self._lock = threading.Lock()
+
+    def budget_rate(self, resource):
+        "The request rate `resource`'s remaining primary budget allows, or None while it isn't running low"
+        remaining, reset = self.budgets.get(resource, (None, 0))
+        now = time.time()
+        if remaining is None or reset <= now or remaining >= s.RATE_LIMIT_RESERVE:
+            return None
+        return max(remaining, 1) / (reset - now)
+
+    def acquire(self, kind=None, resource="core"):
+        """Blocks until the next request may be sent.
+
+        Args:
+            kind (string): "delete" or "write" for requests that change something, from write_kind
+            resource (string): the primary budget the request counts against, from resource_of
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.filled_at) * self.rate)
+                self.filled_at = now
+                wait = max(self.resume_at - time.time(), 0)
+                if kind:
+                    wait = max(wait, self.next_write.get(kind, 0) - now)
+                budget = self.budget_rate(resource)
+                if budget is not None:
+                    wait = max(wait, self.next_request.get(resource, 0) - now)
+                if wait == 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    if kind:
+                        self.next_write[kind] = now + self.intervals[kind]
+                    if budget is not None:
+                        self.next_request[resource] = now + 1 / budget
+                    return
+                if wait == 0:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def observe(self, response):
+        "Records the primary budget reported in a response's headers"
+        headers = response.headers
+        if "X-RateLimit-Remaining" in headers and "X-RateLimit-Reset" in headers:
+            resource = headers.get("X-RateLimit-Resource", "core")
+            with self._lock:
+                self.budgets[resource] = (int(headers["X-RateLimit-Remaining"]), int(headers["X-RateLimit-Reset"]))
+
+    def back_off(self, seconds):
+        "Pauses every request for `seconds`, plus some jitter"
+        with self._lock:
+            resume_at = time.time() + seconds + random.uniform(0, 1)
+            if resume_at <= self.resume_at:
+                return
+            self.resume_at = resume_at
+        print(f"Rate limited by GitHub; pausing requests for {seconds:.0f} seconds.", file=sys.stderr)
+
+    def estimate(self, requests, resource="core", writes=None):
+        """Returns the seconds `requests` requests should take at the current rate,
+        including the spacing of writes and any wait for the primary budget to reset.
+
+        Args:
+            requests (int): number of requests
+            resource (string): the primary budget they count against
+            writes (dict): how many of them are of each write kind, e.g. {"write": 300}
+        """
+        with self._lock:
+            budget = self.budget_rate(resource)
+        rate = min(self.rate, budget) if budget else self.rate
+        seconds = max(requests - self.burst, 0) / rate
+        for kind, count in (writes or {}).items():
+            seconds = max(seconds, max(count - 1, 0) * self.intervals[kind])
+        remaining, reset = self.budgets.get(resource, (None, 0))
+        if remaining is not None and requests > remaining:
+            seconds = max(seconds, reset - time.time())
+        return seconds
+
+
+def write_kind(request):
+    """Returns "delete" or "write" for a request that changes something on
+    GitHub, or None for reads. GraphQL queries are POSTs but only read.
+    """
+    if request.method in ("GET", "HEAD") or request.url.endswith("/graphql"):
+        return None
+    return "delete" if request.method == "DELETE" else "write"
+
+
+def resource_of(request):
+    "Returns the primary rate limit resource a request counts against"
+    path = urlparse(request.url).path
+    if path.endswith("/graphql"):
+        return "graphql"
+    if "/search/" in path:
+        return "search"
+    return "core"
+
+
+def retry_delay(response, attempt):
+    """Returns how many seconds to wait before retrying a rate-limited response,
+    or None if the response was not rate limited.
+    """
+    if response.status_code not in (403, 429):
+        return None
+    headers = response.headers
+    if "Retry-After" in headers:
+        return float(headers["Retry-After"])
+    if headers.get("X-RateLimit-Remaining") == "0" and "X-RateLimit-Reset" in headers:
+        return max(float(headers["X-RateLimit-Reset"]) - time.time(), 1)
+    if "secondary rate limit" in response.text.lower():
+        # GitHub asks for at least a minute, growing with each retry
+        return 60 * 2 ** attempt
+    return None
@@ -0,0 +1,118 @@
+#repo_index.py
+
+from collections import namedtuple
+from datetime import datetime, timezone
+import json
+import os
+import time
+from timings import phase
+import settings as s
+
+RepoInfo = namedtuple("RepoInfo", ["name", "clone_url", "pushed_at", "default_branch", "size"])
+
+
+class RepoIndex:
+    """Every repo in an organization, by name, from a single paginated listing.
+
+    Looking a student repo up here costs no requests, so modes only need to
+    ask GitHub about repos that actually exist.
+
+    Args:
+        repos (dict): maps repo names to RepoInfo
+        built_at (float): when the listing was made, as a unix timestamp
+    """
+    def __init__(self, repos, built_at):
+        self.repos = repos
+        self.built_at = built_at
+
+    def get(self, repo_name):
+        "Returns the RepoInfo of a repo, or None if the organization has no such repo"
+        return self.repos.get(repo_name)
+
+    def __contains__(self, repo_name):
+        return repo_name in self.repos
+
+    def add(self, info):
+        self.repos[info.name] = info
+
+    def remove(self, repo_name):
+        self.repos.pop(repo_name, None)
+
+
+def index_file(org_name):
+    return f"{s.INDEX_DIRECTORY}/{org_name}.json"
+
+
+def repo_info(repo):
+    "Returns the RepoInfo of a PyGithub Repository"
+    return RepoInfo(repo.name, repo.clone_url, repo.pushed_at, repo.default_branch, repo.size)
+
+
+def build_index(session):
+    "Lists every repo in the session's organization, 100 per page"
+    return RepoIndex({repo.name: repo_info(repo) for repo in session.org.get_repos()}, time.time())
+
+
+def load_index(session, refresh=False, ttl_minutes=s.INDEX_TTL_MINUTES):
+    """Returns the organization's RepoIndex, from the copy on disk if it is less
+    than `ttl_minutes` old, otherwise from a fresh listing, which is saved.
+    """
+    path = index_file(session.org_name)
+    if not refresh:
+        try:
+            with open(path) as file:
+                data = json.load(file)
+            if time.time() - data["built_at"] < ttl_minutes * 60:
+                repos = {}
+                for row in data["repos"]:
+                    info = RepoInfo(*row)
+                    pushed_at = datetime.fromisoformat(info.pushed_at) if info.pushed_at else None
+                    repos[info.name] = info._replace(pushed_at=pushed_at)
+                return RepoIndex(repos, data["built_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    print(f"Listing the repos in {session.org_name}...")
+    with phase("org index"):
+        index = build_index(session)
+    save_index(session.org_name, index)
+    return index
+
+
+def save_index(org_name, index):
+    path = index_file(org_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rows = [
+        info._replace(pushed_at=info.pushed_at.isoformat() if info.pushed_at else None)
+        for info in index.repos.values()
+    ]
+    with open(path, 'w') as file:
+        json.dump({"built_at": index.built_at, "repos": rows}, file)
+
+
+def pushed_since(index, repo_names, since):
+    """Returns the repos among `repo_names` that were pushed to after `since`
+    (an aware datetime), without asking GitHub anything.
+    """
+    since = since.astimezone(timezone.utc)
+    return [
+        name for name in repo_names
+        if name in index and index.get(name).pushed_at and index.get(name).pushed_at > since
+    ]
+
+
+def unchanged(index, state, repo_name, key):
+    """True if a repo's pushed_at in the index is the one recorded under `key`
+    in its RepoState, i.e. nothing has been pushed since that was recorded.
+    """
+    info = index.get(repo_name) if index else None
+    if info is None or info.pushed_at is None:
+        return False
+    return state.get(repo_name).get(key) == info.pushed_at.isoformat()
+
+
+def record_pushed_at(index, state, repo_name, key):
+    "Records a repo's pushed_at from the index under `key` in its RepoState"
+    info = index.get(repo_name) if index else None
+    if info is not None and info.pushed_at is not None:
+        state.update(repo_name, **{key: info.pushed_at.isoformat()})
@@ -1,133 +1,485 @@
 #!/opt/homebrew/bin/python3
 
 
-from github import Github, GithubException
-from datetime import datetime
+# GitHub modes import PyGithub and the session when they run, not here, so
+# `--help`, `pull --offline` and `log --source local` start quickly
+from collections import namedtuple
+from datetime import datetime, timezone
+from runner import run_students, print_results
+from local_git import PullResult, SnapshotResult, PULLED, SNAPSHOTTED, find_repos, pull_repo, pull_repos, repo_logs, latest_commits, snapshot_repos, is_clone, head_sha, clone_options, update_reference
+from commits import CommitRecord, hkt_tz
+from output import FORMATS, open_writer, TeeWriter
+from commit_store import CommitStore
+from state import RepoState
+from journal import Journal, Journals, journal_file, finished
+from roster import load_roster
+from timings import phase, profiler
+import progress
+from repo_index import load_index, save_index, repo_info, pushed_since, unchanged, record_pushed_at
 import settings as s
 import argparse
 import subprocess
+import sys
+import csv
 import os
-import pytz
-from secret import GITHUB_ACCESS_TOKEN
 
-# Define the Hong Kong timezone
-hkt_tz = pytz.timezone('Asia/Hong_Kong')
+def create_repos(session, template_repo, new_repo_name, user, index, public=False, permission="admin"):
+    """Create a new repository from a template repository and add the student
+    as a collaborator. If the repository already exists, only add the student
+    if they aren't a collaborator yet, so re-running after a partial failure
+    only does the remaining work.
 
-def get_org(org_name):
-    "Looks up the GitHub Organization named in s.GITHUB_ORGANIZATION"
-    g = authenticate()
-    
-    for org in g.get_user().get_orgs():
-        if org.login == org_name:
-            return org
-
-
-def authenticate():
-    if GITHUB_ACCESS_TOKEN is None:
-        raise ValueError("You need a GITHUB ACCESS TOKEN. "
-            "Go to https://github.com/settings/tokens, "
-            "get one, and add it to tasks/settings.py."
-        )
-    return Github(GITHUB_ACCESS_TOKEN)
-
-def create_repos(org_name,template_repo_name, new_repo_name,user, public=False,  permission="admin"):
-    """Create a new repository from a template repository
+    Args:
+        session (GitHubSession): the run's session
+        template_repo (Repository): template to create the repo from, looked up once per run
+        new_repo_name (string): name of the new repository
+        user (string): github username of the student
+        index (RepoIndex): the organization's repos, to check whether the repo already exists
     """
-    g=authenticate()
-    owner = get_org(org_name)
-
+    from github import GithubException
     try:
-        # Get the template repository from the organization
-        template_repo = owner.get_repo(template_repo_name)
-
-        new_repo = owner.create_repo_from_template(name=new_repo_name, repo=template_repo, private=not public)
+        if new_repo_name in index:
+            new_repo = session.get_repo(new_repo_name, lazy=True)
+            print(f"Repository already exists: {session.org_name}/{new_repo_name}")
 
-        print(f"Successfully created new repository: {new_repo.full_name}")
+            if new_repo.has_in_collaborators(user):
+                print(f"  - '{user}' is already a collaborator.")
+                print()
+                return new_repo
+        else:
+            new_repo = session.org.create_repo_from_template(name=new_repo_name, repo=template_repo, private=not public)
+            index.add(repo_info(new_repo))
+            print(f"Successfully created new repository: {new_repo.full_name}")
         
         # Add collaborators to the new repository
-        # if users:
         print("Adding collaborators...")
       
         try:
-            user_to_add = g.get_user(user)
-            new_repo.add_to_collaborators(user_to_add, permission=permission)
+            # passing the login rather than a NamedUser saves a request per student
+            new_repo.add_to_collaborators(user, permission=permission)
             print(f"  - Added '{user}' with '{permission}' permission.")
         except GithubException as e:
             print(f"  - Failed to add user '{user}': {e}")
+            return None
         
-        return new_repo
-    
         print()
+        return new_repo
     
     except GithubException as e:
         print(f"An error occurred during repository creation or collaborator addition: {e}")
         return None
 
-def delete_repo(repo):   
-    g=authenticate()
-    owner = get_org().login
-
-    full_repo_name = f"{owner}/{repo}"
+def delete_repo(session, repo, index):
+    "Deletes a repo found in the org index, with a single request"
+    from github import GithubException
+    full_repo_name = f"{session.org_name}/{repo}"
     
     try:
-        repo_to_delete = g.get_repo(full_repo_name)
-        print(f"Found repository to delete: {repo_to_delete.full_name}")
-        repo_to_delete.delete()
-        print(f". - Successfully deleted repository: {full_repo_name}")
+        session.get_repo(repo, lazy=True).delete()
+        index.remove(repo)
+        print(f"Deleted repository: {full_repo_name}")
         return True
     except GithubException as e:
         print(f"Failed to delete repository '{full_repo_name}': {e}")
         return False
 
-def get_repo_log(org_name,repo_name, name):
-    g = authenticate()
-    owner_org = get_org(org_name).login
-    full_repo_name = f"{owner_org}/{repo_name}"
-    
+def confirm(prompt, expected):
+    "Asks the user to type `expected`; False if they type anything else or there is no input"
     try:
-        repo = g.get_repo(full_repo_name)
-        commits = repo.get_commits()
-        commit_count = commits.totalCount-1
+        return input(prompt).strip() == expected
+    except EOFError:
+        print()
+        return False
 
-        print(f"{s.CYAN}{name} has {commit_count} commits.{s.RESET}")
+def delete_repos(sessions, indexes, tasks, jobs=s.JOBS, dry_run=False, yes=False, journal=None):
+    """Deletes every task's repo as one batch, across labs and organizations:
+    lists what will be deleted, asks once for confirmation, then deletes in parallel.
 
-        if commit_count > 0:
-            for commit in commits[:commit_count]:
-                hkt_date = commit.commit.author.date.astimezone(hkt_tz)
+    Args:
+        sessions (dict): maps each organization to its GitHubSession
+        indexes (dict): maps each organization to a fresh listing of its repos
+        tasks (dict): maps each name shown in the results to its Task
+        jobs (int): number of repos to delete at once
+        dry_run (bool): only list what would be deleted
+        yes (bool): don't ask for confirmation
+        journal (Journal): where each deleted repo is recorded, for --resume
 
-                print(f" [{hkt_date.strftime('%Y-%m-%d %H:%M:%S %Z')}] {commit.stats.total} lines ({commit.stats.additions} additions, {commit.stats.deletions} deletions)")
-                print(f"  - {commit.commit.message}")
-                # print(f"  - Changes: {commit.stats.total} lines ({commit.stats.additions} additions, {commit.stats.deletions} deletions)")
+    Returns:
+        A list with each task's result, in order: True if its repo was
+        deleted, False if not, None if there was no repo.
+    """
+    found = {name: task for name, task in tasks.items() if task_repo(task) in indexes[org_of(task.course)]}
+    missing = [name for name in tasks if name not in found]
+    orgs = list(dict.fromkeys(org_of(task.course) for task in tasks.values()))
 
+    for org in orgs:
+        in_org = [task for task in found.values() if org_of(task.course) == org]
+        print(f"{s.CYAN}{len(in_org)} repos to delete from {org}:{s.RESET}")
+        for task in in_org:
+            info = indexes[org].get(task_repo(task))
+            pushed = format_date(info.pushed_at) if info.pushed_at else "never pushed"
+            print(f"  {task_repo(task)}  (last push {pushed})")
+    if missing:
+        labs = ", ".join(dict.fromkeys(tasks[name].lab for name in missing))
+        print(f"{len(missing)} students have no {labs} repo: {', '.join(missing)}")
+    print()
 
+    expected = " ".join(org for org in orgs if any(org_of(task.course) == org for task in found.values()))
+    deleted = {}
+    if found and dry_run:
+        print("Dry run: nothing was deleted.")
         print()
+    elif found and not yes and not confirm(f"Type '{expected}' to delete these {len(found)} repos: ", expected):
+        print("Cancelled: nothing was deleted.")
+        print()
+    elif found:
+        def work(name):
+            org = org_of(found[name].course)
+            return delete_repo(sessions[org], task_repo(found[name]), indexes[org])
+
+        session = sessions[orgs[0]]
+        results = run_students(list(found), work, jobs, "delete", lambda: session.api_calls, journal)
+        print_results(results)
+        for org in orgs:
+            save_index(org, indexes[org])
+        deleted = {r.name: r.ok for r in results}
+
+    return [deleted.get(name, False) if name in found else None for name in tasks]
+
+def format_date(date):
+    return date.astimezone(hkt_tz).strftime('%Y-%m-%d %H:%M:%S %Z')
+
+def status_summary(results):
+    "Counts PullResults or SnapshotResults by status; returns the counts and e.g. '3 updated, 1 error'"
+    counts = {}
+    for r in results:
+        counts[r.status] = counts.get(r.status, 0) + 1
+    return counts, ", ".join(f"{count} {status}" for status, count in counts.items())
+
+def print_commit(commit):
+    total = commit.additions + commit.deletions
+    print(f" [{format_date(commit.date)}] {total} lines ({commit.additions} additions, {commit.deletions} deletions)")
+    print(f"  - {commit.message}")
+
+def print_repo_log(name, commit_count, commits):
+    """Prints each of a student's commits, newest first, and then their count.
+    The count comes last because a REST log streams its commits and only knows
+    how many there were at the end.
+
+    Args:
+        name (string): student github username
+        commit_count (int): number of commits made by the student
+        commits (iterable): the student's CommitRecords, without the template's initial commit
+    """
+    for commit in commits:
+        print_commit(commit)
+    print_commit_count(name, commit_count)
+
+def print_commit_count(name, commit_count):
+    print(f"{s.CYAN}{name} has {commit_count} commits.{s.RESET}")
+    print()
+
+def print_new_commits(name, commits, last):
+    "Prints the commits a student made since the head recorded in `last`, if there are any"
+    if commits:
+        since = format_date(datetime.fromisoformat(last["head_date"]))
+        print(f"{s.CYAN}{name} has {len(commits)} new commits since {since}.{s.RESET}")
+        for commit in commits:
+            print_commit(commit)
+        print()
+
+def new_commits(commits, last):
+    "Returns the commits, newest first, that came after the head recorded in `last`"
+    new = []
+    for commit in commits:
+        if commit.sha == last["head_sha"]:
+            break
+        new.append(commit)
+    return new
+
+def unchanged_log(index, state, repo_name, last):
+    "True if `log --since-last` can skip a repo: it has a recorded head and hasn't been pushed to since"
+    return "head_sha" in last and unchanged(index, state, repo_name, "log_pushed_at")
+
+def record_head(state, repo_name, commits):
+    "Remembers the newest of a repo's commits, so the next `log --since-last` can start there"
+    if state and commits:
+        head = commits[0]
+        state.update(repo_name,
+            head_sha=head.sha,
+            head_date=head.date.isoformat(),
+            checked_at=datetime.now(hkt_tz).isoformat(),
+        )
+
+def commit_pages(commits):
+    """Yields a PyGithub commit listing one page at a time.
+
+    Iterating a PaginatedList keeps every commit it has fetched, so memory
+    grows with the history; fetching pages with get_page doesn't, so only the
+    current page is held. A page shorter than s.PAGE_SIZE is the last one, so
+    no request is made for an empty page after it.
+    """
+    page = 0
+    while True:
+        with phase("commit pages"):
+            listed = commits.get_page(page)
+        yield listed
+        if len(listed) < s.PAGE_SIZE:
+            return
+        page += 1
+
+def commit_record(commit):
+    "Turns a PyGithub commit into a CommitRecord; its stats cost one request"
+    with phase("commit stats"):
+        stats = commit.stats
+    return CommitRecord(commit.sha, commit.commit.author.date, stats.additions, stats.deletions, commit.commit.message)
+
+def student_commits(repo):
+    """Yields a repo's commits as pages of CommitRecords, newest first, leaving
+    out the oldest, the template's initial commit. One commit is held back
+    until the next arrives, since the oldest is only known when the history
+    ends; its stats are never fetched.
+    """
+    held = None
+    for listed in commit_pages(repo.get_commits()):
+        records = []
+        for commit in listed:
+            if held is not None:
+                records.append(commit_record(held))
+            held = commit
+        yield records
+
+def get_repo_log(session, repo_name, name, state=None, writer=None):
+    """Prints each of a student's commits, newest first, and then how many there
+    were. Commits are streamed a page at a time, printed and stored as they
+    arrive, so memory stays flat however long the history is.
+
+    Returns the number of commits, or -1 on failure.
+    """
+    from github import GithubException
+    full_repo_name = f"{session.org_name}/{repo_name}"
+    
+    try:
+        repo = session.get_repo(repo_name, lazy=True)
+        commit_count = 0
+        head = []
+        for records in student_commits(repo):
+            for commit in records:
+                print_commit(commit)
+            if writer and records:
+                writer.write(name, records)
+            head = head or records[:1]
+            commit_count += len(records)
+
+        # only once every commit is stored, so a run that stops partway reads them again
+        record_head(state, repo_name, head)
+        print_commit_count(name, commit_count)
         return commit_count
     
     except GithubException as e:
         print(f"Failed to get commit count for '{full_repo_name}': {e}")
         return -1
 
-def clone_repo(org_name,lab_name, repo_name, full_directory, section=None):
+def get_new_commits(session, state, repo_name, name, writer=None):
+    """Prints only the commits pushed to a repo since the last `log` run, asking
+    GitHub for commits since the recorded head date. Falls back to the full log
+    for repos with no recorded head.
+
+    Returns the number of new commits, or -1 on failure.
+    """
+    from github import GithubException
+    last = state.get(repo_name)
+    if "head_sha" not in last:
+        return get_repo_log(session, repo_name, name, state, writer)
+
+    full_repo_name = f"{session.org_name}/{repo_name}"
+
+    try:
+        repo = session.get_repo(repo_name, lazy=True)
+        # PyGithub formats `since` as UTC without converting it, and head dates
+        # read by GraphQL or git keep the author's offset
+        since = datetime.fromisoformat(last["head_date"]).astimezone(timezone.utc)
+
+        records = []
+        for listed in commit_pages(repo.get_commits(since=since)):
+            new = new_commits(listed, last)
+            records.extend(commit_record(commit) for commit in new)
+            if len(new) < len(listed):
+                break
+
+        print_new_commits(name, records, last)
+        if writer:
+            writer.write(name, records)
+        record_head(state, repo_name, records)
+        return len(records)
+
+    except GithubException as e:
+        print(f"Failed to get new commits for '{full_repo_name}': {e}")
+        return -1
+
+def get_repo_logs_graphql(session, lab_name, users, state=None, since_last=False, writer=None, index=None):
+    """Prints every student's commit log, like get_repo_log, but fetches the
+    histories of many repos per GraphQL request instead of one REST request
+    per commit.
+
+    With `since_last`, only commits newer than each repo's recorded head are
+    fetched and printed, and repos the `index` shows haven't been pushed to
+    since the last run aren't queried at all.
+
+    Returns:
+        A list with each student's commit count (-1 on failure), in roster order
+    """
+    from github_graphql import get_repo_logs
+    repo_names = {name: f"{lab_name}_{name}" for name in users}
+
+    since = None
+    last_seen = None
+    skipped = set()
+    if since_last:
+        last_seen = {repo_name: state.get(repo_name) for repo_name in repo_names.values()}
+        skipped = {repo_name for repo_name in repo_names.values() if unchanged_log(index, state, repo_name, last_seen[repo_name])}
+        # One `since` covers the whole query, so use the oldest head; newer
+        # heads are trimmed by sha below.
+        wanted = [last for repo_name, last in last_seen.items() if repo_name not in skipped]
+        if wanted and all("head_date" in last for last in wanted):
+            since = min(datetime.fromisoformat(last["head_date"]) for last in wanted).isoformat()
+
+    logs = get_repo_logs(session, [repo_name for repo_name in repo_names.values() if repo_name not in skipped], since)
+    logs.update((repo_name, []) for repo_name in skipped)
+
+    failures = {repo_name: f"Failed to get commit count for '{session.org_name}/{repo_name}'" for repo_name in repo_names.values()}
+    counts = print_repo_logs(repo_names, logs, failures, state, last_seen, writer)
+    if since_last:
+        for repo_name, count in zip(repo_names.values(), counts):
+            if count >= 0:
+                record_pushed_at(index, state, repo_name, "log_pushed_at")
+    return counts
+
+def get_repo_logs_local(lab_name, users, full_directory, section=None, jobs=s.JOBS, state=None, since_last=False, writer=None):
+    """Prints every student's commit log, like get_repo_log, from the clones
+    that clone_repo made instead of from GitHub. Runs `git log` in up to `jobs`
+    clones at once, needs no network, and uses none of the rate limit.
+
+    Returns:
+        A list with each student's commit count (-1 on failure), in roster order
+    """
+    base_dir = lab_directory(full_directory, lab_name, section)
+    repo_names = {name: f"{lab_name}_{name}" for name in users}
+    paths = {repo_name: f"{base_dir}/{repo_name}" for repo_name in repo_names.values()}
+
+    by_path = repo_logs(list(paths.values()), jobs)
+    logs = {repo_name: by_path[path] for repo_name, path in paths.items()}
+
+    last_seen = None
+    if since_last:
+        last_seen = {repo_name: state.get(repo_name) for repo_name in repo_names.values()}
+
+    failures = {repo_name: f"No readable clone of '{repo_name}' at '{path}'" for repo_name, path in paths.items()}
+    return print_repo_logs(repo_names, logs, failures, state, last_seen, writer)
+
+def print_repo_logs(repo_names, logs, failures, state=None, last_seen=None, writer=None):
+    """Prints the logs of many students' repos, fetched in bulk.
+
+    Args:
+        repo_names (dict): maps each student to their repo name
+        logs (dict): maps each repo name to its CommitRecords, newest first, or to None
+        failures (dict): maps each repo name to the message printed when its log is None
+        state (RepoState): where each repo's newest commit is recorded
+        last_seen (dict): the recorded state of each repo, when only new commits are wanted
+        writer (CommitWriter): optional file the printed commits are also written to
+
+    Returns:
+        A list with each student's commit count (-1 on failure), in roster order
+    """
+    counts = []
+    for name, repo_name in repo_names.items():
+        commits = logs[repo_name]
+        if commits is None:
+            print(failures[repo_name])
+            print()
+            counts.append(-1)
+            continue
+
+        if last_seen and "head_sha" in last_seen[repo_name]:
+            commits = new_commits(commits, last_seen[repo_name])
+            printed = commits
+            print_new_commits(name, printed, last_seen[repo_name])
+            counts.append(len(commits))
+        elif not commits:
+            # an empty repo: nothing was pushed, not even the template's commit
+            printed = commits
+            print_commit_count(name, 0)
+            counts.append(0)
+        else:
+            commit_count = len(commits)-1
+            printed = commits[:commit_count]
+            print_repo_log(name, commit_count, printed)
+            counts.append(commit_count)
+        if writer:
+            writer.write(name, printed)
+        record_head(state, repo_name, commits)
+    return counts
+
+def lab_directory(full_directory, lab_name, section=None):
+    "Returns the directory clone_repo puts a lab's repos in"
+    if section:
+        return f"{full_directory}/{section}/{lab_name}"
+    return f"{full_directory}/{lab_name}"
+
+def clone_repo(session, lab_name, repo_name, full_directory, section=None, options=(), skip_existing=False, index=None, state=None):
     """
     Clones a GitHub repository to a specified local directory.
 
     Args:
-        args (argparse.Namespace): The parsed command-line arguments.
+        session (GitHubSession): the run's session
+        lab_name (string): lab template name
+        repo_name (string): name of the student repo
+        full_directory (string): clone directory for the course
+        section (string): optional section subdirectory
+        options (list): extra `git clone` arguments, from local_git.clone_options
+        skip_existing (bool): leave a directory that already holds a clone alone
+        index (RepoIndex): the organization's repos; saves asking GitHub for each clone url
+        state (RepoState): records each clone's pushed_at, so an unchanged repo isn't cloned or pulled again
+
+    A repo that is already cloned is pulled instead, unless nothing has been
+    pushed to it since.
     """
+    from github import GithubException
     try:
-        g = authenticate()
-        owner_org = get_org(org_name).login
-        full_repo_name = f"{owner_org}/{repo_name}"
-        
-        repo = g.get_repo(full_repo_name)
-        clone_url = repo.clone_url
+        full_repo_name = f"{session.org_name}/{repo_name}"
+        dir_repo = f"{lab_directory(full_directory, lab_name, section)}/{repo_name}"
+
+        if skip_existing and is_clone(dir_repo):
+            print(f"Skipping '{repo_name}': already cloned in '{dir_repo}'.")
+            print()
+            return True
 
+        if state and is_clone(dir_repo) and unchanged(index, state, repo_name, "pulled_pushed_at"):
+            print(f"Skipping '{repo_name}': no pushes since it was cloned or pulled.")
+            print()
+            return True
 
-        if section:
-            dir_repo = f"{full_directory}/{section}/{lab_name}/{repo_name}"
+        if is_clone(dir_repo):
+            with phase("git pull", repo=repo_name):
+                pulled = pull_repo(dir_repo)
+            print(f"Pulling '{repo_name}': already cloned in '{dir_repo}'; {pulled.status}.")
+            if pulled.detail:
+                print(f"    {pulled.detail.splitlines()[-1]}")
+            print()
+            if pulled.status not in PULLED:
+                return False
+            if state:
+                record_pushed_at(index, state, repo_name, "pulled_pushed_at")
+            return True
 
+        if index:
+            info = index.get(repo_name)
+            if info is None:
+                print(f"  - Failed to find repository '{repo_name}': not in {session.org_name}")
+                return False
+            clone_url = info.clone_url
         else:
-            dir_repo = f"{full_directory}/{lab_name}/{repo_name}"
+            clone_url = session.get_repo(repo_name).clone_url
 
 
         print(f"Cloning '{repo_name}'")
@@ -139,16 +491,20 @@ def clone_repo(org_name,lab_name, repo_name, full_directory, section=None):
             print(f"  -Warning: Directory '{dir_repo}' already exists. Cloning into it.")
         
         # Run the git clone command using subprocess
-        result = subprocess.run(
-            ["git", "clone", clone_url, dir_repo],
-            check=True,
-            capture_output=True,
-            text=True
-        )
+        with phase("git clone", repo=repo_name):
+            result = subprocess.run(
+                ["git", "clone", *options, clone_url, dir_repo],
+                check=True,
+                capture_output=True,
+                text=True
+            )
 
+        if state:
+            record_pushed_at(index, state, repo_name, "pulled_pushed_at")
         print(f"  - Successfully cloned '{full_repo_name}'.")
         # print("Git output:\n", result.stdout)
         print()
+        return True
 
     except subprocess.CalledProcessError as e:
         print(f"  - Error during git clone: {e}")
@@ -159,165 +515,761 @@ def clone_repo(org_name,lab_name, repo_name, full_directory, section=None):
         print(f"  - Authentication error: {e}")
     except Exception as e:
         print(f"  - An unexpected error occurred: {e}")
+    return False
 
-def pull_all_repos(lab_name, full_directory, section):
+def prepare_reference(session, lab_name, full_directory):
+    """Mirrors the lab's template repo under full_directory/.reference, so
+    student clones made from it can borrow its objects instead of downloading
+    them again. Returns the mirror's path, or None if it couldn't be made.
     """
-    Iterates through a directory and pulls the latest changes for each Git repository found.
-    
+    from github import GithubException
+    path = f"{full_directory}/.reference/{lab_name}.git"
+    try:
+        print(f"Updating reference copy of template '{lab_name}'...")
+        update_reference(session.get_repo(lab_name).clone_url, path)
+        print()
+        return path
+    except subprocess.CalledProcessError as e:
+        print(f"  - Could not mirror the template, cloning without it: {e.stderr}")
+    except GithubException as e:
+        print(f"  - Failed to find template repository '{lab_name}', cloning without it: {e}")
+    return None
+
+def pull_all_repos(labs, jobs=s.JOBS):
+    """
+    Pulls the latest changes for every Git repository in the lab directories,
+    running up to `jobs` git pulls at once across all of them.
+
     Args:
-        args (argparse.Namespace): The parsed command-line arguments.
+        labs (list): (directory, index, state) for each lab: the directory
+            clone_repo put its repos in, the organization's RepoIndex, with when
+            each repo was last pushed to, or None, and the organization's
+            RepoState, with each repo's pushed_at when it was last cloned or
+            pulled; repos pushed to since then are the only ones fetched
+        jobs (int): number of repos to pull at once
+
+    Returns the number of labs with no clone directory and repos that failed to pull.
     """
 
-    if section:
-        base_dir = f"{full_directory}/{section}/{lab_name}"
+    paths = []
+    indexes = {}
+    states = {}
+    failed = 0
+    for base_dir, index, state in labs:
+        if not os.path.isdir(base_dir):
+            print(f"Error: Directory '{base_dir}' not found.")
+            failed += 1
+            continue
+
+        print(f"Searching for repositories in '{base_dir}'...")
+        found = find_repos(base_dir)
+        if not found:
+            print(f"No Git repositories found in '{base_dir}'.")
+        for path in found:
+            paths.append(path)
+            indexes[path] = index
+            states[path] = state
+
+    if not paths:
+        print()
+        return failed
+
+    skipped = {}
+    for path in paths:
+        repo_name = os.path.basename(path)
+        if states[path] and indexes[path] and unchanged(indexes[path], states[path], repo_name, "pulled_pushed_at"):
+            skipped[path] = PullResult(repo_name, "unchanged", head_sha(path), "")
+
+    pulled = dict(zip(
+        [path for path in paths if path not in skipped],
+        pull_repos([path for path in paths if path not in skipped], jobs),
+    ))
+    results = [skipped.get(path) or pulled[path] for path in paths]
+
+    for path, r in pulled.items():
+        if states[path] and indexes[path] and r.status in PULLED:
+            record_pushed_at(indexes[path], states[path], r.name, "pulled_pushed_at")
+
+    width = max(len(r.name) for r in results)
+    for r in results:
+        sha = r.sha[:7] if r.sha else "-------"
+        print(f"{r.name.ljust(width)}  {r.status.ljust(10)}  {sha}")
+        if r.detail:
+            print(f"    {r.detail.splitlines()[-1]}")
+
+    counts, summary = status_summary(results)
+    print(f"{s.CYAN}Pulled {len(results)} repos: {summary}.{s.RESET}")
+    print()
+    return failed + sum(count for status, count in counts.items() if status not in PULLED and status != "unchanged")
+
+LATEST_COLUMNS = ["student", "section", "repo", "sha", "date", "commits", "additions", "deletions", "message"]
+
+# longest commit message line shown in the `latest` table
+LATEST_MESSAGE_WIDTH = 60
+
+def latest_report(session, lab_name, users, full_directory, section=None, jobs=s.JOBS, sections=None, out=None):
+    """Prints every student's latest commit on the default branch, oldest
+    first, like the old `latest_commit` task with order='date'.
+
+    Args:
+        session (GitHubSession): when given, the heads come from one batched
+            GraphQL query per s.GRAPHQL_BATCH_SIZE repos; otherwise from the clones clone_repo made
+        lab_name (string): lab template name
+        users (list): student github usernames
+        full_directory (string): clone directory for the course
+        section (string): optional section subdirectory
+        jobs (int): number of clones read at once
+        sections (dict): maps each student to their section
+        out (string): optional CSV file the table is also written to
 
+    Returns the number of students with commits of their own, and the number
+    whose repo couldn't be read.
+    """
+    repo_names = {name: f"{lab_name}_{name}" for name in users}
+    if session:
+        from github_graphql import get_latest_commits
+        latest = get_latest_commits(session, list(repo_names.values()))
+        missing = f"not found in {session.org_name}"
     else:
-        base_dir = f"{full_directory}/{lab_name}"
+        base_dir = lab_directory(full_directory, lab_name, section)
+        by_path = latest_commits([f"{base_dir}/{repo_name}" for repo_name in repo_names.values()], jobs)
+        latest = {os.path.basename(path): head for path, head in by_path.items()}
+        missing = f"no clone in '{base_dir}'"
 
+    rows = []
+    for name, repo_name in repo_names.items():
+        head, count = latest[repo_name] or (None, None)
+        rows.append((name, repo_name, head, count))
+    # oldest first, then students with no commits, then those without a repo
+    rows.sort(key=lambda row: (row[2] is None, row[3] is None, row[2].date.timestamp() if row[2] else 0))
 
-    if not os.path.isdir(base_dir):
-        print(f"Error: Directory '{base_dir}' not found.")
-        return
+    width = max(len(name) for name in users)
+    print(f"{s.CYAN}{'student'.ljust(width)}  {'latest commit'.ljust(24)}  sha      commits  {'changes'.ljust(11)}  message{s.RESET}")
+    for name, repo_name, head, count in rows:
+        if count is None:
+            print(f"{name.ljust(width)}  {missing}")
+        elif head is None:
+            print(f"{name.ljust(width)}  no commits")
+        else:
+            message = head.message.strip().splitlines()[0] if head.message.strip() else ""
+            if len(message) > LATEST_MESSAGE_WIDTH:
+                message = message[:LATEST_MESSAGE_WIDTH - 3] + "..."
+            changes = f"+{head.additions} -{head.deletions}"
+            print(f"{name.ljust(width)}  {format_date(head.date).ljust(24)}  {head.sha[:7]}  {max(count - 1, 0):>7}  {changes.ljust(11)}  {message}")
+
+    # the template's own commit is the first; students who only have it haven't started
+    started = sum(1 for name, repo_name, head, count in rows if count and count > 1)
+    print(f"{s.CYAN}{started} of {len(users)} students have commits of their own.{s.RESET}")
+    print()
+
+    if out:
+        with open(out, "w", newline="") as file:
+            latest_writer = csv.DictWriter(file, fieldnames=LATEST_COLUMNS)
+            latest_writer.writeheader()
+            for name, repo_name, head, count in rows:
+                latest_writer.writerow({
+                    "student": name,
+                    "section": (sections or {}).get(name),
+                    "repo": repo_name,
+                    "sha": head.sha if head else None,
+                    "date": head.date.astimezone(hkt_tz).isoformat() if head else None,
+                    "commits": max(count - 1, 0) if count is not None else None,
+                    "additions": head.additions if head else None,
+                    "deletions": head.deletions if head else None,
+                    "message": head.message if head else None,
+                })
+        print(f"Wrote the table to '{out}'.")
+        print()
+    return started, sum(1 for row in rows if row[3] is None)
+
+MANIFEST_COLUMNS = ["student", "section", "repo", "sha", "date", "status", "deadline"]
+
+def read_manifest(path):
+    "Returns the sha each repo was exported at by an earlier snapshot, from its manifest"
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline="") as file:
+        return {row["repo"]: row["sha"] for row in csv.DictReader(file) if row["status"] in SNAPSHOTTED}
+
+def snapshot_lab(session, lab_name, users, full_directory, graded_directory, deadline, section=None, jobs=s.JOBS, sections=None):
+    """Exports every student's repo as it was at `deadline` into graded_directory,
+    one plain directory per student, and writes a manifest.csv of the shas
+    exported. The files come from the clones clone_repo made, with `git archive`,
+    up to `jobs` repos at once.
+
+    Args:
+        session (GitHubSession): when given, one batched GraphQL query per
+            s.GRAPHQL_BATCH_SIZE repos says which commit was the last before the
+            deadline, so pushes not yet pulled count; otherwise each clone is asked
+        lab_name (string): lab template name
+        users (list): student github usernames
+        full_directory (string): clone directory for the course
+        graded_directory (string): directory for the course's snapshots
+        deadline (datetime): the newest commit at or before this is exported
+        section (string): optional section subdirectory
+        jobs (int): number of repos to export at once
+        sections (dict): maps each student to their section, for the manifest
+
+    Returns the number of repos exported or already exported at the same sha.
+    """
+    deadline = deadline.astimezone(hkt_tz)
+    repo_names = {name: f"{lab_name}_{name}" for name in users}
+    clone_dir = lab_directory(full_directory, lab_name, section)
+    graded_dir = lab_directory(graded_directory, lab_name, section)
+    manifest = f"{graded_dir}/manifest.csv"
+    previous = read_manifest(manifest)
+
+    heads = {}
+    if session:
+        from github_graphql import get_heads_before
+        heads = get_heads_before(session, list(repo_names.values()), deadline.isoformat())
+
+    print(f"Exporting {len(users)} repos as they were at {format_date(deadline)} to '{graded_dir}'...")
+    repos = [
+        (f"{clone_dir}/{repo_name}", f"{graded_dir}/{repo_name}", heads.get(repo_name), previous.get(repo_name))
+        for repo_name in repo_names.values()
+        if not session or heads[repo_name] is not None
+    ]
+    exported = {r.name: r for r in snapshot_repos(repos, deadline, jobs)}
+
+    results = {}
+    for repo_name in repo_names.values():
+        results[repo_name] = exported.get(repo_name) or SnapshotResult(
+            repo_name, "error", None, None, f"Failed to find '{session.org_name}/{repo_name}'")
+
+    os.makedirs(graded_dir, exist_ok=True)
+    with open(manifest, "w", newline="") as file:
+        manifest_writer = csv.DictWriter(file, fieldnames=MANIFEST_COLUMNS)
+        manifest_writer.writeheader()
+        for name, repo_name in repo_names.items():
+            r = results[repo_name]
+            manifest_writer.writerow({
+                "student": name,
+                "section": (sections or {}).get(name),
+                "repo": repo_name,
+                "sha": r.sha,
+                "date": r.date.astimezone(hkt_tz).isoformat() if r.date else None,
+                "status": r.status,
+                "deadline": deadline.isoformat(),
+            })
+
+    width = max(len(name) for name in users)
+    for name, repo_name in repo_names.items():
+        r = results[repo_name]
+        sha = r.sha[:7] if r.sha else "-------"
+        date = format_date(r.date) if r.date else ""
+        print(f"{name.ljust(width)}  {r.status.ljust(10)}  {sha}  {date}")
+        if r.detail:
+            print(f"    {r.detail.splitlines()[-1]}")
+
+    counts, summary = status_summary(results.values())
+    print(f"{s.CYAN}Snapshot of {len(results)} repos: {summary}.{s.RESET}")
+    print(f"Wrote the shas to '{manifest}'.")
+    print()
+    return sum(counts.get(status, 0) for status in SNAPSHOTTED)
+
+# typical GitHub requests made for each student, by mode; REST logs fetch a
+# page of commits and then the stats of each, so assume a typical lab's commit count
+CALLS_PER_STUDENT = {
+    'log': 1 + s.TYPICAL_COMMITS,
+    'create': 2,
+    'clone': 0,
+    'delete': 1,
+    'status': 0,
+    'pull': 0,
+    'snapshot': 0,
+    'latest': 0,
+}
+
+# of those, the requests that change something, which GitHub wants spaced
+# out (s.WRITES_PER_SECOND, s.DELETES_PER_SECOND): create makes the repo and
+# adds the collaborator
+WRITES_PER_STUDENT = {
+    'create': {"write": 2},
+    'delete': {"delete": 1},
+}
+
+def repo_status(index, lab_name, users, since):
+    """Prints when each student last pushed to their repo, newest first, marking
+    those who pushed after `since`. Uses only the org index: no per-student requests.
+
+    Returns the number of students who pushed after `since`, and the number
+    with no repo.
+    """
+    since = since.astimezone(hkt_tz)
+    repo_names = {name: f"{lab_name}_{name}" for name in users}
+    pushed = set(pushed_since(index, repo_names.values(), since))
+
+    rows = []
+    for name, repo_name in repo_names.items():
+        info = index.get(repo_name)
+        rows.append((name, info.pushed_at if info else None, info is not None))
+    rows.sort(key=lambda row: row[1].timestamp() if row[1] else float('-inf'), reverse=True)
+
+    width = max(len(name) for name in users)
+    print(f"{s.CYAN}{'student'.ljust(width)}  last push{s.RESET}")
+    for name, pushed_at, exists in rows:
+        if not exists:
+            when = "no repo"
+        elif pushed_at is None:
+            when = "never"
+        else:
+            when = format_date(pushed_at)
+        marker = "  *" if repo_names[name] in pushed else ""
+        print(f"{name.ljust(width)}  {when}{marker}")
+
+    print(f"{s.CYAN}{len(pushed)} of {len(users)} students pushed since {format_date(since)}.{s.RESET}")
+    print()
+    return len(pushed), sum(1 for row in rows if not row[2])
+
+def parse_since(text):
+    "Parses a --since or --deadline time such as '2025-03-01 08:00'; times without a zone are HKT"
+    since = datetime.fromisoformat(text)
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=hkt_tz)
+    return since
+
+def estimate_requests(mode, source, counts):
+    """Returns the expected number of GitHub requests for a run, the rate limit
+    resource they use, and how many of them are writes of each kind
+
+    Args:
+        mode (string): the run's mode
+        source (string): where log, latest and snapshot read history from
+        counts (list): the number of students in each lab of the run
+    """
+    if mode in ('log', 'snapshot', 'latest') and source == 'graphql':
+        return sum(-(-students // s.GRAPHQL_BATCH_SIZE) for students in counts), "graphql", {}
+    writes = {kind: sum(counts) * per for kind, per in WRITES_PER_STUDENT.get(mode, {}).items()}
+    return sum(counts) * CALLS_PER_STUDENT[mode], "core", writes
+
+# one lab of one course, and one student's part of it
+Target = namedtuple("Target", ["course", "lab"])
+Task = namedtuple("Task", ["course", "lab", "student"])
 
-    original_dir = os.getcwd()
+def has_token():
+    "True if secret.py gives a GitHub token; checked without importing PyGithub"
     try:
-        print(f"Searching for repositories in '{base_dir}'...")
-        repo_found = False
-        for entry in os.scandir(base_dir):
-            if entry.is_dir() and os.path.exists(os.path.join(entry.path, '.git')):
-                repo_found = True
-                repo_name = entry.name
-                print(f"\n--- Pulling changes for '{repo_name}' ---")
-                os.chdir(entry.path)
-                
-                try:
-                    result = subprocess.run(
-                        ["git", "pull"],
-                        check=True,
-                        capture_output=True,
-                        text=True
-                    )
-                    print(result.stdout)
-                    if result.stderr:
-                        print("Git stderr:\n", result.stderr)
-
-                except subprocess.CalledProcessError as e:
-                    print(f"Error during git pull for '{repo_name}': {e}")
-                    print("Git stderr:\n", e.stderr)
-                except Exception as e:
-                    print(f"An unexpected error occurred for '{repo_name}': {e}")
-                
-                os.chdir(original_dir) # Change back to the original directory
-        
-        if not repo_found:
-            print(f"No Git repositories found in '{base_dir}'.")
+        from secret import GITHUB_ACCESS_TOKEN
+    except ImportError:
+        return False
+    return GITHUB_ACCESS_TOKEN is not None
+
+def open_sessions(courses, no_cache=False):
+    """Authenticates once for a run. Returns the session and a dict mapping
+    each organization of `courses` to a session sharing its client.
+    """
+    from session import GitHubSession
+    from http_cache import ResponseCache
+    cache = None if no_cache else ResponseCache()
+    orgs = list(dict.fromkeys(org_of(course) for course in courses))
+    session = GitHubSession(orgs[0], cache=cache)
+    return session, {org: session.for_org(org) for org in orgs}
+
+def pull_indexes(courses, no_cache=False):
+    """Lists the organizations of `courses` afresh, so pull can skip the repos
+    nobody has pushed to since they were last pulled.
 
+    Returns the session and a dict mapping each organization to its RepoIndex,
+    or (None, {}) when GitHub can't be reached, and every clone is pulled.
+    """
+    from github import GithubException
+    from requests import RequestException
+    session = None
+    try:
+        session, sessions = open_sessions(courses, no_cache)
+        return session, {org: load_index(org_session, refresh=True) for org, org_session in sessions.items()}
+    except (GithubException, RequestException) as e:
+        print(f"Could not list the organization ({e}), so pulling every clone.")
         print()
-    
-    except Exception as e:
-        print(f"An error occurred while processing the directory: {e}")
-    finally:
-        os.chdir(original_dir) # Ensure we always change back to the original directory
+        if session:
+            session.close()
+        return None, {}
 
-def get_repos(course, section=None, csv=None, ):
-    users = []
+def org_of(course):
+    return s.COURSES[course]["org"]
 
-    if csv == None:
-        file_name = "roster.csv"
-    else:
-        file_name = csv
+def clone_directory(course):
+    "The directory a course's labs are cloned into"
+    return f"{s.CLONE_DIRECTORY}/{s.COURSES[course]['directory']}"
 
-    with open(file_name, 'r') as file:
-        data = file.read()
-        
-    lines = data.strip().split('\n')
-    
-    for line in lines:
-        parts = line.split(',')
-        
-        if len(parts) >= 2:
-            if parts[0] == course:
-                if section:
-                    if parts[-1] == section: 
-                        users.append(parts[1].strip())  
+def task_repo(task):
+    return f"{task.lab}_{task.student}"
 
-                else:
-                    users.append(parts[1].strip())   
-    
-    return users
+def read_labs_file(path):
+    """Reads a lab manifest: one lab per line, either `lab` (for every --course)
+    or `course lab`. Blank lines and lines starting with # are skipped.
+
+    Returns a list of (course or None, lab).
+    """
+    labs = []
+    with open(path) as file:
+        for line_number, line in enumerate(file, start=1):
+            words = line.split("#", 1)[0].split()
+            if not words:
+                continue
+            if len(words) > 2:
+                raise ValueError(f"{path} line {line_number}: expected 'lab' or 'course lab'")
+            if len(words) == 2 and words[0] not in s.COURSES:
+                raise ValueError(f"{path} line {line_number}: unknown course '{words[0]}'")
+            labs.append((words[0], words[1]) if len(words) == 2 else (None, words[0]))
+    return labs
+
+def lab_targets(courses, labs, labs_file=None):
+    """Returns every (course, lab) a run covers, in order, without repeats:
+    each of `labs` in each of `courses`, then the labs in `labs_file`.
+    Labs may also be given separated by commas.
+    """
+    targets = [Target(course, lab) for lab in ",".join(labs or []).split(",") if lab for course in courses or []]
+    if labs_file:
+        for course, lab in read_labs_file(labs_file):
+            targets += [Target(course, lab)] if course else [Target(c, lab) for c in courses or []]
+    return list(dict.fromkeys(targets))
+
+def task_names(tasks, targets):
+    """Names each task for the progress display, the results table and the
+    journal: just the student when the run covers one lab, otherwise with the
+    lab in front, and the course too when there are several.
+    """
+    several_courses = len({target.course for target in targets}) > 1
+    several_labs = len({target.lab for target in targets}) > 1 or several_courses
+    names = {}
+    for task in tasks:
+        parts = ([task.course] if several_courses else []) + ([task.lab] if several_labs else []) + [task.student]
+        names["/".join(parts)] = task
+    return names
+
+def out_file(path, *parts):
+    """Names one of the files a run writes for several labs or courses after
+    --out, e.g. report.csv for lab_api becomes report_lab_api.csv.
+    """
+    stem, extension = os.path.splitext(path)
+    return f"{stem}_{'_'.join(parts)}{extension}"
 
 def main():
     """
     Parses command-line arguments and runs the appropriate GitHub API function.
 
     e.g. python repo_management.py log --course mwc --lab lab_database 
+
+    Several labs and courses are handled in one run, e.g.
+    python repo_management.py clone --course mwc dp --lab lab_a lab_b
+
+    Returns the number of students the run failed for, or None when it stopped
+    before starting on them.
     """
     
     parser = argparse.ArgumentParser(description="GitHub Repository Management CLI")
     
     # required arguements
-    parser.add_argument("mode", help="Options: log, create, delete, clone, pull")
-    parser.add_argument("--lab", help="Lab template name", required=True)
-    parser.add_argument("--course", help="mwc or dp", required=True)
+    parser.add_argument("mode", help="Options: log, create, delete, clone, pull, status, snapshot, analyze, latest")
+    parser.add_argument("--lab", nargs="+", help="Lab template names; analyze also takes 'all'")
+    parser.add_argument("--course", nargs="+", choices=list(s.COURSES), help="Course codes from the roster")
 
     # optional arguement 
+    parser.add_argument("--labs-file", help="File listing more labs, one per line as 'lab' or 'course lab'")
     parser.add_argument("--section", help="Lab template name") #optional section
     parser.add_argument("--csv", help="Custom csv") #optional section
+    parser.add_argument("--source", choices=["graphql", "rest", "local"], default="graphql", help="Where log, snapshot and latest read commit history from")
+    parser.add_argument("--since-last", action="store_true", help="log only the commits pushed since the last log run")
+    parser.add_argument("--no-cache", action="store_true", help="Don't use the on-disk cache of GitHub responses")
+    parser.add_argument("--format", choices=FORMATS, help="Also write log's commits to a file in this format")
+    parser.add_argument("--out", help="File for --format (default: <lab>_commits.<format>); for analyze and latest, a CSV of the table. With several labs or courses, one file each, e.g. out_<lab>.csv")
+    parser.add_argument("--depth", type=int, help="clone only this many commits of history")
+    parser.add_argument("--filter", help="partial clone filter for clone, e.g. blob:none")
+    parser.add_argument("--reference", action="store_true", help="clone sharing objects with a local mirror of the template repo")
+    parser.add_argument("--skip-existing", action="store_true", help="clone skips repos that are already cloned")
+    parser.add_argument("--since", type=parse_since, help="status marks students who pushed after this time (HKT), e.g. '2025-03-01 08:00'")
+    parser.add_argument("--deadline", type=parse_since, help="snapshot exports each repo as it was at this time (HKT), e.g. '2025-03-01 23:59'")
+    parser.add_argument("--refresh-index", action="store_true", help="List the organization's repos again even if the saved index is fresh")
+    parser.add_argument("--offline", action="store_true", help="pull every clone without listing the organization first, and read log, latest and snapshot from the clones (--source local); needs no GitHub token")
+    parser.add_argument("--dry-run", action="store_true", help="delete only lists the repos it would delete")
+    parser.add_argument("--yes", action="store_true", help="delete without asking for confirmation")
+    parser.add_argument("--resume", action="store_true", help="create, clone and delete skip the students an earlier run of the same lab finished")
+    parser.add_argument("--no-progress", action="store_true", help="Don't show completed/failed counts, request rate and ETA while working")
+    parser.add_argument("--profile", action="store_true", help="Print how long each phase took and the requests made to each endpoint")
+    parser.add_argument("--trace", help="With --profile, also write a Chrome trace of the run to this file")
+    parser.add_argument("--jobs", type=int, default=s.JOBS, help="Number of students to work on at once")
 
 
     args = parser.parse_args()
+    if args.profile or args.trace:
+        profiler.enable()
+    if args.no_progress:
+        progress.enabled = False
 
     print()
 
-    if args.course == 'mwc':
-        org_name = "the-isf-academy"
-        full_directory = f"{s.CLONE_DIRECTORY}/mwc"
+    # log, latest and snapshot read the clones when offline; the GitHub modes can't run at all
+    if args.offline and args.mode in ('log', 'latest', 'snapshot'):
+        args.source = 'local'
+    elif args.offline and args.mode not in ('pull', 'analyze'):
+        print(f"{args.mode} needs GitHub; --offline only applies to pull, log, latest and snapshot.")
+        return
+    if args.mode == 'snapshot' and args.deadline is None:
+        print("snapshot needs a --deadline.")
+        return
+    if args.mode in ('snapshot', 'latest') and args.source == 'rest':
+        print(f"{args.mode} reads history with --source graphql or local.")
+        return
 
-        if args.csv:
-            users = get_repos('mwc', args.section, args.csv)
-        elif args.section:
-            users = get_repos('mwc', args.section)
-        else:
-            users = get_repos('mwc')
+    try:
+        targets = lab_targets(args.course, args.lab, args.labs_file)
+    except (OSError, ValueError) as e:
+        print(f"Could not read the labs file: {e}")
+        return
+    if not targets:
+        print("Give the labs to work on with --lab and --course, or with --labs-file.")
+        return
+    courses = list(dict.fromkeys(target.course for target in targets))
+    several = len(targets) > 1
 
-    elif args.course == 'dp':
-        org_name = "isf-dp-cs"
-        full_directory = f"{s.CLONE_DIRECTORY}/dp"
+    def file_prefix(target):
+        "What a lab's output files are named after: the lab, or course_lab when there are several courses"
+        return f"{target.course}_{target.lab}" if len(courses) > 1 else target.lab
 
-        if args.section:
-            users = get_repos('dp', args.section)
-        else:
-            users = get_repos('dp')
+    try:
+        with phase("roster"):
+            roster = load_roster(args.csv or s.ROSTER_FILE, courses)
+    except (OSError, ValueError) as e:
+        print(f"Could not read the roster: {e}")
+        return
+    students = {course: roster.students(course, args.section) for course in courses}
+    sections = {course: {student.login: student.section for student in students[course]} for course in courses}
+    tasks = [Task(target.course, target.lab, student.login) for target in targets for student in students[target.course]]
+    names = task_names(tasks, targets)
 
-    if users:
-        for name in users:
-            repo_name = f"{args.lab}_{name}"
-            # print(repo_name)
-            # print(org_name)
+    # create, clone and delete journal each student they finish; --resume
+    # skips the ones a run that died halfway had already done
+    journal = None
+    if args.mode in ('create', 'clone', 'delete') and tasks:
+        paths = {target: journal_file(target.course, target.lab, args.mode) for target in targets}
+        if args.resume:
+            done = {target: finished(path) for target, path in paths.items()}
+            left = [task for task in tasks if task.student not in done[(task.course, task.lab)]]
+            print(f"Resuming {args.mode}: {len(tasks) - len(left)} students were finished by an earlier run, {len(left)} left.")
+            print()
+            tasks = left
+            left = set(left)
+            names = {name: task for name, task in names.items() if task in left}
+        journal = Journals({target: Journal(path, resume=args.resume) for target, path in paths.items()}, names)
 
-            if args.mode == 'log':
-                get_repo_log(org_name, repo_name, name)
+    def lab_tasks(target):
+        return [task for task in tasks if (task.course, task.lab) == target]
 
-            elif args.mode == 'delete':
-                delete_repo(repo_name)
-        
-            elif args.mode == 'create':
-                create_repos(org_name, args.lab, repo_name, user=name)
+    # --format files are opened before authenticating, so a missing pyarrow or
+    # an --out in a directory that doesn't exist is reported before any request
+    files = {}
+    if args.mode == 'log' and args.format:
+        try:
+            for target in targets:
+                if not args.out:
+                    out = f"{file_prefix(target)}_commits.{args.format}"
+                else:
+                    out = out_file(args.out, file_prefix(target)) if several else args.out
+                files[target] = open_writer(args.format, out, target.lab, sections[target.course])
+        except (OSError, ValueError) as e:
+            print(f"Could not open the {args.format} file: {e}")
+            for writer in files.values():
+                writer.close()
+            return
+
+    # one client, connection pool and rate limiter serve every organization in
+    # the run. Everything the run opens is closed however it ends, Ctrl-C
+    # included, so the commits stored so far are kept.
+    session = None
+    sessions = {}
+    state = None
+    store = None
+    writers = dict(files)
+    failed = 0
+    try:
+        offline = args.offline or (args.mode in ('log', 'snapshot', 'latest') and args.source == 'local')
+        # pull only lists the organization to skip unchanged repos, so without a
+        # token it pulls every clone, and never imports PyGithub
+        if args.mode == 'pull' and not offline and not has_token():
+            print("No GitHub token, so pulling every clone without listing the organization.")
+            print()
+            offline = True
+        if tasks and args.mode in ('log', 'delete', 'create', 'clone', 'status', 'snapshot', 'latest') and not offline:
+            session, sessions = open_sessions(courses, args.no_cache)
+            session.estimate(*estimate_requests(args.mode, args.source, [len(lab_tasks(target)) for target in targets]))
 
+        # modes which only need to know which repos exist, and their urls, read
+        # them from one listing of the organization. Modes that skip repos nobody
+        # has pushed to since they last looked need an up to date listing, as do
+        # create and delete.
+        skip_unchanged = args.mode in ('clone', 'pull') or (args.mode == 'log' and args.since_last)
+        indexes = {}
+        if tasks and args.mode == 'pull' and not offline:
+            session, indexes = pull_indexes(courses, args.no_cache)
+        elif session and (args.mode in ('delete', 'create', 'clone', 'status') or args.source == 'rest' or skip_unchanged):
+            refresh = args.refresh_index or args.mode in ('create', 'delete') or skip_unchanged
+            indexes = {org: load_index(org_session, refresh=refresh) for org, org_session in sessions.items()}
 
-            elif args.mode =='clone':
-                if args.section:
-                    clone_repo(org_name, args.lab, repo_name, full_directory, args.section)
-                else:
-                    clone_repo(org_name, args.lab, repo_name, full_directory)
+        state = RepoState() if args.mode in ('log', 'clone', 'pull') else None
+
+        def org_state(course):
+            "The state of the repos of a course's organization"
+            return state.for_org(org_of(course)) if state else None
+
+        if args.mode == 'log':
+            store = CommitStore()
+            for target in targets:
+                writer = store.writer(target.course, target.lab, sections[target.course])
+                writers[target] = TeeWriter([writer, files[target]]) if target in files else writer
+
+        counts = []
+        # create, clone, delete and REST logs share one pool of workers across every lab
+        pooled = args.mode in ('create', 'clone', 'delete') or (args.mode == 'log' and args.source == 'rest')
 
+        if args.mode == 'analyze':
+            from analysis import analyze
+            for course in courses:
+                users = [student.login for student in students[course]]
+                if users:
+                    with phase("analyze"):
+                        summary = analyze(course, [target.lab for target in targets if target.course == course], users,
+                            sections[course], out_file(args.out, course) if args.out and len(courses) > 1 else args.out)
+                    if summary is None:
+                        failed += len(users)
+
+        elif args.mode == 'pull':
+            failed = pull_all_repos([
+                (lab_directory(clone_directory(target.course), target.lab, args.section), indexes.get(org_of(target.course)), org_state(target.course))
+                for target in targets
+            ], args.jobs)
+
+        elif session and args.mode == 'delete':
+            deleted = delete_repos(sessions, indexes, names, args.jobs, args.dry_run, args.yes, journal)
+            failed = 0 if args.dry_run else deleted.count(False)
+
+        elif session and pooled:
+            template_repos = {}
+            if args.mode == 'create':
+                from github import GithubException
+                for target in targets:
+                    try:
+                        template_repos[target] = sessions[org_of(target.course)].get_repo(target.lab)
+                    except GithubException as e:
+                        print(f"Failed to find template repository '{target.lab}': {e}")
+                        return len(names)
+
+            options = {}
+            if args.mode == 'clone':
+                for target in targets:
+                    directory = clone_directory(target.course)
+                    reference = prepare_reference(sessions[org_of(target.course)], target.lab, directory) if args.reference else None
+                    options[target] = clone_options(args.depth, args.filter, reference)
+
+            def work(key):
+                task = names[key]
+                target = Target(task.course, task.lab)
+                org = org_of(task.course)
+                task_session, index, name, repo_name = sessions[org], indexes.get(org), task.student, task_repo(task)
+                task_state = org_state(task.course)
+                if several:
+                    print(f"{s.CYAN}{task.course} {task.lab}{s.RESET}")
+
+                if index and args.mode == 'log' and repo_name not in index:
+                    print(f"Failed to get commit count for '{org}/{repo_name}': not found")
+                    print()
+                    return -1
+
+                elif args.mode == 'log' and args.since_last:
+                    if unchanged_log(index, task_state, repo_name, task_state.get(repo_name)):
+                        return 0
+                    count = get_new_commits(task_session, task_state, repo_name, name, writers[target])
+                    if count >= 0:
+                        record_pushed_at(index, task_state, repo_name, "log_pushed_at")
+                    return count
+
+                elif args.mode == 'log':
+                    return get_repo_log(task_session, repo_name, name, task_state, writers[target])
+
+                elif args.mode == 'create':
+                    return create_repos(task_session, template_repos[target], repo_name, name, index)
+
+                elif args.mode =='clone':
+                    return clone_repo(task_session, task.lab, repo_name, clone_directory(task.course), args.section,
+                        options[target], args.skip_existing, index, task_state)
+
+            results = run_students(list(names), work, args.jobs, args.mode, lambda: session.api_calls, journal)
+            print_results(results)
+            counts = [r.result for r in results]
+            failed = sum(1 for r in results if not r.ok)
+
+            if args.mode == 'create':
+                for org, index in indexes.items():
+                    save_index(org, index)
 
-    if args.mode == 'pull':
-        if args.section:
-            pull_all_repos(args.lab, full_directory, args.section)
         else:
-            pull_all_repos(args.lab, full_directory)
+            for target in targets:
+                org = org_of(target.course)
+                task_session, index = sessions.get(org), indexes.get(org)
+                users = [task.student for task in lab_tasks(target)]
+                full_directory = clone_directory(target.course)
+                logged = []
+                if not users:
+                    continue
+                if several:
+                    print(f"{s.CYAN}== {target.course} {target.lab} =={s.RESET}")
+                    print()
 
-if __name__ == "__main__":
-    main()
+                if args.mode == 'log' and args.source == 'local':
+                    logged = get_repo_logs_local(target.lab, users, full_directory, args.section, args.jobs, org_state(target.course), args.since_last, writers[target])
+
+                elif task_session and args.mode == 'log':
+                    logged = get_repo_logs_graphql(task_session, target.lab, users, org_state(target.course), args.since_last, writers[target], index)
 
+                elif task_session and args.mode == 'status':
+                    pushed, missing = repo_status(index, target.lab, users, args.since or datetime.fromtimestamp(0, hkt_tz))
+                    failed += missing
+
+                elif args.mode == 'latest':
+                    out = out_file(args.out, file_prefix(target)) if args.out and several else args.out
+                    started, missing = latest_report(task_session, target.lab, users, full_directory, args.section, args.jobs, sections[target.course], out)
+                    failed += missing
+
+                elif args.mode == 'snapshot':
+                    graded_directory = f"{s.GRADED_DIRECTORY}/{s.COURSES[target.course]['directory']}"
+                    exported = snapshot_lab(task_session, target.lab, users, full_directory, graded_directory, args.deadline, args.section, args.jobs, sections[target.course])
+                    failed += len(users) - exported
+
+                if args.mode == 'log':
+                    counts += logged
+                    failed += sum(1 for count in logged if count < 0)
+
+        if args.mode == 'log' and args.since_last and tasks:
+            print(f"{s.CYAN}{counts.count(0)} students have no new commits.{s.RESET}")
+            print()
+    finally:
+        if session:
+            session.report()
+            session.close()
+
+        if state:
+            state.close()
+
+        if journal:
+            journal.close()
+
+        for writer in writers.values():
+            writer.close()
+
+        if store:
+            store.close()
+
+    if profiler.enabled:
+        profiler.summary()
+        if args.trace:
+            profiler.write_trace(args.trace)
+    return failed
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print()
+        print("Interrupted. create, clone and delete can pick up where they stopped with --resume.")
+        sys.exit(130)
@@ -0,0 +1,112 @@
+#roster.py
+
+from collections import defaultdict, namedtuple
+import csv
+import os
+import pickle
+import re
+import settings as s
+
+Student = namedtuple("Student", ["course", "login", "section"])
+
+# GitHub logins are alphanumeric with single hyphens, at most 39 characters
+LOGIN = re.compile(r"^[A-Za-z0-9](?:[A-Za-z0-9]|-(?=[A-Za-z0-9])){0,38}$")
+
+HEADER = ("course", "login")
+
+
+class Roster:
+    """Every student in the roster file, indexed by (course, section).
+
+    Args:
+        students (list): Student rows, in file order
+    """
+    def __init__(self, students):
+        self.index = defaultdict(list)
+        for student in students:
+            self.index[(student.course, None)].append(student)
+            if student.section:
+                self.index[(student.course, student.section)].append(student)
+
+    def students(self, course, section=None):
+        "Returns the students in a course, or in one section of it"
+        return self.index.get((course, section), [])
+
+    def courses(self):
+        return sorted({course for course, section in self.index})
+
+
+def parse_roster(path):
+    """Parses and validates a roster file with columns course, github username
+    and (optionally) section. A header row starting with course,login is
+    skipped. As in the original parser, extra columns are allowed and the
+    section is the last one.
+
+    Returns:
+        The valid Student rows, in file order, and a list of (course, problem)
+        for the rows that aren't valid
+    """
+    students = []
+    problems = []
+    with open(path, newline='') as file:
+        for line_number, row in enumerate(csv.reader(file), start=1):
+            row = [cell.strip() for cell in row]
+            if not any(row):
+                continue
+            if line_number == 1 and tuple(cell.lower() for cell in row[:2]) == HEADER:
+                continue
+            course = row[0]
+            if len(row) < 2:
+                problems.append((course, f"line {line_number}: expected at least 2 columns (course, login, section), got {len(row)}"))
+                continue
+            login = row[1]
+            section = row[-1] if len(row) >= 3 and row[-1] else None
+            if not course:
+                problems.append((course, f"line {line_number}: missing course"))
+            elif not LOGIN.match(login):
+                problems.append((course, f"line {line_number}: '{login}' is not a valid github username"))
+            else:
+                students.append(Student(course, login, section))
+    return students, problems
+
+
+def load_roster(path=s.ROSTER_FILE, courses=None, cache_file=s.ROSTER_CACHE):
+    """Returns the Roster in `path`, reusing the parsed copy in `cache_file`
+    while the roster file's modification time and size are unchanged.
+
+    Bad rows in `courses` (every course, when not given) raise a ValueError
+    listing them all. Bad rows of other courses are left out with a warning,
+    so a typo in one course's rows doesn't stop work on another.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+    parsed = None
+    try:
+        with open(cache_file, 'rb') as file:
+            cached_key, students, problems = pickle.load(file)
+        if cached_key == key:
+            parsed = students, problems
+    except (OSError, EOFError, ValueError, AttributeError, ImportError, pickle.UnpicklingError):
+        pass
+
+    if parsed is None:
+        parsed = parse_roster(path)
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(cache_file, 'wb') as file:
+                pickle.dump((key, *parsed), file)
+        except OSError:
+            pass
+
+    students, problems = parsed
+    errors = [problem for course, problem in problems if courses is None or course in courses]
+    if errors:
+        raise ValueError(f"{path} has errors:\n" + "\n".join(f" - {error}" for error in errors))
+    others = [problem for course, problem in problems if courses is not None and course not in courses]
+    if others:
+        print(f"Skipping {len(others)} bad rows of other courses in {path}:")
+        for problem in others:
+            print(f" - {problem}")
+        print()
+    return Roster(students)
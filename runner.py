@@ -0,0 +1,174 @@
+#runner.py
+
+from collections import namedtuple
+import io
+import sys
+import threading
+import time
+from timings import phase
+from progress import show_progress
+import settings as s
+
+StudentResult = namedtuple("StudentResult", ["name", "ok", "seconds", "result"])
+
+
+class GroupedOutput(io.TextIOBase):
+    """Stands in for sys.stdout while workers run.
+
+    Prints from a worker thread are collected in that thread's buffer and
+    written out in one piece when its student is finished, so output stays
+    grouped by student. A student's buffer holds everything printed for
+    them, e.g. their whole commit log. With `grouped` False (one worker,
+    where nothing interleaves) and for prints from any other thread, output
+    goes straight through. The progress line, if any, is cleared before
+    each piece is written.
+    """
+    def __init__(self, stream, grouped=True):
+        self.stream = stream
+        self.grouped = grouped
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.progress = None
+
+    def start(self):
+        self.local.buffer = io.StringIO() if self.grouped else None
+
+    def finish(self):
+        buffer = self.local.buffer
+        self.local.buffer = None
+        if buffer is not None:
+            self.emit(buffer.getvalue())
+
+    def emit(self, text):
+        with self.lock:
+            if self.progress:
+                self.progress.clear()
+            self.stream.write(text)
+            self.stream.flush()
+        return len(text)
+
+    def write(self, text):
+        buffer = getattr(self.local, "buffer", None)
+        if buffer is not None:
+            return buffer.write(text)
+        return self.emit(text)
+
+    def flush(self):
+        if getattr(self.local, "buffer", None) is None:
+            self.stream.flush()
+
+
+def succeeded(result):
+    "Mode functions signal failure by returning None, False or -1"
+    if result is None or result is False:
+        return False
+    if isinstance(result, int) and not isinstance(result, bool) and result < 0:
+        return False
+    return True
+
+
+def run_students(users, work, jobs=1, label=None, requests=None, journal=None):
+    """Runs work(name) for every student on a bounded pool of worker threads,
+    showing their progress. On Ctrl-C, the students already started are
+    finished and the rest are not started.
+
+    Args:
+        users (list): student github usernames
+        work (function): per-student task, called with the username
+        jobs (int): maximum number of students handled at once
+        label (string): what the progress display calls the work, e.g. "clone"
+        requests (function): returns the GitHub requests made so far, for the progress display
+        journal (Journal): where each finished student is recorded, for --resume
+
+    Returns:
+        A list of StudentResult, in roster order
+    """
+    # imported here: concurrent.futures pulls in logging, which is slow to import
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    # with one worker nothing interleaves, so output streams instead of piling up per student
+    output = GroupedOutput(sys.stdout, grouped=jobs > 1)
+    progress = show_progress(len(users), label or "students", requests, output.lock)
+    output.progress = progress
+
+    def run(name):
+        output.start()
+        progress.begin()
+        start = time.perf_counter()
+        result, ok = None, False
+        try:
+            with phase("student", student=name):
+                result = work(name)
+            ok = succeeded(result)
+        except Exception as e:
+            print(f"  - An unexpected error occurred for '{name}': {e}")
+        finally:
+            output.finish()
+            progress.end(ok)
+        seconds = time.perf_counter() - start
+        if journal:
+            journal.record(name, ok, seconds)
+        return StudentResult(name, ok, seconds, result)
+
+    results = [None] * len(users)
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            futures = {pool.submit(run, name): i for i, name in enumerate(users)}
+            try:
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+            except KeyboardInterrupt:
+                for future in futures:
+                    future.cancel()
+                raise
+    finally:
+        progress.close()
+        sys.stdout = output.stream
+
+    return results
+
+
+def run_parallel(items, work, jobs=1, label=None, ok=succeeded):
+    """Runs work(item) for every item on a bounded pool of worker threads,
+    showing their progress. Unlike run_students, output isn't grouped by item,
+    so work should leave the printing to its caller.
+
+    Args:
+        items (list): what to work on, e.g. clone paths
+        work (function): called with each item
+        jobs (int): maximum number of items handled at once
+        label (string): what the progress display calls the work, e.g. "pull"
+        ok (function): tells from an item's result whether it succeeded
+
+    Returns:
+        A list of the results, in the order of `items`
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    progress = show_progress(len(items), label or "items")
+
+    def run(item):
+        progress.begin()
+        result = work(item)
+        progress.end(ok(result))
+        return result
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            return list(pool.map(run, items))
+    finally:
+        progress.close()
+
+
+def print_results(results):
+    "Prints a per-student table of success/failure and duration"
+    if not results:
+        return
+    width = max(len(r.name) for r in results)
+    failed = [r for r in results if not r.ok]
+
+    print(f"{s.CYAN}{'student'.ljust(width)}  status  seconds{s.RESET}")
+    for r in results:
+        status = "ok" if r.ok else "FAILED"
+        print(f"{r.name.ljust(width)}  {status.ljust(6)}  {r.seconds:7.2f}")
+    print(f"{s.CYAN}{len(results) - len(failed)} succeeded, {len(failed)} failed.{s.RESET}")
+    print()
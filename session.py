@@ -0,0 +1,168 @@
+#session.py
+
+from github import Auth, Github
+from github.Requester import HTTPRequestsConnectionClass, HTTPSRequestsConnectionClass
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from ratelimit import RateLimiter, resource_of, retry_delay, write_kind
+from timings import phase, profiler
+import copy
+import threading
+import time
+import settings as s
+
+
+class Transport(HTTPAdapter):
+    """HTTP adapter mounted under the Github client's requests session.
+
+    Every request PyGithub makes passes through `send`, so this is where a
+    session counts its API calls, revalidates cached responses, and paces
+    requests with its RateLimiter. When GitHub says to slow down, every worker
+    sharing the session waits, not just the one whose request was refused.
+    """
+    def __init__(self, session, **kwargs):
+        super().__init__(**kwargs)
+        self.session = session
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        cache = self.session.cache
+        key = None
+        if cache:
+            with phase("cache lookup"):
+                key = cache.lookup(request)
+
+        limiter = self.session.limiter
+        kind, resource = write_kind(request), resource_of(request)
+        for attempt in range(s.RATE_LIMIT_RETRIES + 1):
+            limiter.acquire(kind, resource)
+            with self._lock:
+                self.requests += 1
+            start = time.perf_counter()
+            response = super().send(request, **kwargs)
+            received = len(response.content)
+            profiler.request(request.method, request.url, start, time.perf_counter() - start,
+                len(request.body or b""), received)
+            limiter.observe(response)
+            delay = retry_delay(response, attempt)
+            if delay is None or attempt == s.RATE_LIMIT_RETRIES:
+                break
+            limiter.back_off(delay)
+
+        if key:
+            with phase("cache update"):
+                return cache.update(key, request, response)
+        return response
+
+
+def connection_class(base, transport):
+    "Returns a PyGithub connection class which sends requests through `transport`"
+    class Connection(base):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.adapter = transport
+            self.session.mount(f"{self.protocol}://", transport)
+    return Connection
+
+
+def authenticate(transport=None, pool_size=s.POOL_SIZE, lazy=False):
+    """Builds an authenticated Github client.
+
+    When a transport is given, every request the client makes is sent through it.
+    A `lazy` client makes objects without fetching them until an attribute is needed.
+    """
+    try:
+        from secret import GITHUB_ACCESS_TOKEN
+    except ImportError:
+        GITHUB_ACCESS_TOKEN = None
+    if GITHUB_ACCESS_TOKEN is None:
+        raise ValueError("You need a GITHUB ACCESS TOKEN. "
+            "Go to https://github.com/settings/tokens, "
+            "get one, and add it to tasks/settings.py."
+        )
+    # Requests, writes included, are paced by the transport, not by PyGithub's
+    # own per-request sleeps, which would serialize worker threads and which
+    # each client would keep separately. Listings are fetched s.PAGE_SIZE per page.
+    g = Github(auth=Auth.Token(GITHUB_ACCESS_TOKEN), base_url=s.GITHUB_API_URL, pool_size=pool_size, per_page=s.PAGE_SIZE,
+        seconds_between_requests=None, seconds_between_writes=None, lazy=lazy)
+
+    if transport:
+        # PyGithub has no public hook for its connection class; overriding it on
+        # this requester (rather than via injectConnectionClasses) keeps the
+        # connection persistent, so the pool is reused for the whole run.
+        requester = g.requester
+        base = HTTPSRequestsConnectionClass if requester.scheme == "https" else HTTPRequestsConnectionClass
+        requester._Requester__connectionClass = connection_class(base, transport)
+    return g
+
+
+class GitHubSession:
+    """One authenticated client and organization, shared by every mode in a run.
+    Other organizations are reached through for_org, which shares the client.
+
+    Args:
+        org_name (string): login of the GitHub organization holding the student repos
+        pool_size (int): number of pooled HTTP connections to api.github.com
+        cache (ResponseCache): optional persistent cache of GET responses
+    """
+    def __init__(self, org_name, pool_size=s.POOL_SIZE, cache=None):
+        self.cache = cache
+        self.limiter = RateLimiter()
+        # rate limits are handled by the transport; urllib3 only retries dropped connections
+        self.transport = Transport(self,
+            max_retries=Retry(total=3, backoff_factor=0.5, status=0),
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+        )
+        with phase("authenticate"):
+            self.github = authenticate(self.transport, pool_size)
+            # get_repo(lazy=True) on the main client would build a fresh requester
+            # that bypasses the transport; a lazy client of our own shares it
+            self.lazy_github = authenticate(self.transport, pool_size, lazy=True)
+        with phase("get_org"):
+            self.org = self.github.get_organization(org_name)
+
+    @property
+    def org_name(self):
+        return self.org.login
+
+    @property
+    def api_calls(self):
+        "Requests sent so far by this session and every session made from it by for_org"
+        return self.transport.requests
+
+    def for_org(self, org_name):
+        """Returns a session for another organization that shares this one's
+        clients, connection pool, rate limiter and cache, so one run can work
+        in several organizations without authenticating again.
+        """
+        if org_name == self.org_name:
+            return self
+        other = copy.copy(self)
+        with phase("get_org"):
+            other.org = self.github.get_organization(org_name)
+        return other
+
+    def get_repo(self, repo_name, lazy=False):
+        "Looks up a repo in the session's organization"
+        github = self.lazy_github if lazy else self.github
+        with phase("get_repo"):
+            return github.get_repo(f"{self.org_name}/{repo_name}")
+
+    def estimate(self, requests, resource="core", writes=None):
+        "Prints how long `requests` requests, `writes` of them writes by kind, should take at the allowed rate"
+        seconds = self.limiter.estimate(requests, resource, writes)
+        print(f"{s.CYAN}About {requests} GitHub requests; estimated {seconds:.0f} seconds.{s.RESET}")
+        print()
+
+    def report(self):
+        print(f"{s.CYAN}{self.api_calls} GitHub API calls.{s.RESET}")
+        if self.cache:
+            self.cache.report()
+
+    def close(self):
+        self.github.close()
+        self.lazy_github.close()
+        if self.cache:
+            self.cache.close()
@@ -4,5 +4,79 @@ CLONE_DIRECTORY="/Users/eqbrown/Documents/CS/student_work"
 
 ROSTER_FILE = "roster.csv"
 
+# parsed copy of the roster, reused until the roster file changes
+ROSTER_CACHE = f"{CLONE_DIRECTORY}/.repoview/roster.pickle"
+
+# course code (column 1 of the roster) -> GitHub organization and clone subdirectory
+COURSES = {
+    "mwc": {"org": "the-isf-academy", "directory": "mwc"},
+    "dp": {"org": "isf-dp-cs", "directory": "dp"},
+}
+
+# GitHub REST API root; GraphQL is served from /graphql under it
+GITHUB_API_URL = "https://api.github.com"
+
+# number of pooled HTTP connections the shared GitHub session keeps open
+POOL_SIZE = 10
+
+# default number of students handled at once (--jobs)
+JOBS = 8
+
+# how many times a rate-limited request is retried after backing off
+RATE_LIMIT_RETRIES = 5
+
+# steady request rate and burst size; GitHub's secondary limits allow about 900 REST points a minute
+REQUESTS_PER_SECOND = 12
+REQUEST_BURST = 20
+
+# requests that create content (repos, invitations) are limited to about 80 a minute;
+# deletes only count against the secondary limit, at 5 of its 900 points a minute
+WRITES_PER_SECOND = 1
+DELETES_PER_SECOND = 2.5
+
+# below this many requests left in the hourly budget, requests are spread out until it resets
+RATE_LIMIT_RESERVE = 500
+
+# items per page of a REST listing (repos, commits); 100 is the most GitHub allows
+PAGE_SIZE = 100
+
+# commits in a typical student lab repo, used to estimate how long a REST `log` takes
+TYPICAL_COMMITS = 20
+
+# persistent cache of GitHub responses, revalidated with ETags (--no-cache skips it)
+CACHE_FILE = f"{CLONE_DIRECTORY}/.repoview/http_cache.sqlite"
+CACHE_MAX_MB = 200
+CACHE_MAX_AGE_DAYS = 30
+# new cache entries are committed together at most this often, and when the run ends
+CACHE_COMMIT_SECONDS = 1
+
+# what earlier runs saw in each student repo, e.g. the head `log --since-last` starts from
+STATE_FILE = f"{CLONE_DIRECTORY}/.repoview/state.sqlite"
+
+# every commit `log` reads, one table per course and lab, for `analyze`
+COMMIT_STORE = f"{CLONE_DIRECTORY}/.repoview/commits.sqlite"
+
+# commits made from the first hour (HKT) up to the second count as late-night in `analyze`
+LATE_NIGHT_HOURS = (0, 6)
+
+# where create, clone and delete record each finished student, for --resume;
+# the journal is flushed after every student but only synced to disk this often
+JOURNAL_DIRECTORY = f"{CLONE_DIRECTORY}/.repoview/journal"
+JOURNAL_FSYNC_SECONDS = 1
+
+# number of repos looked up in each aliased GraphQL query
+GRAPHQL_BATCH_SIZE = 50
+
+# saved listing of each organization's repos, reused for INDEX_TTL_MINUTES (--refresh-index lists again)
+INDEX_DIRECTORY = f"{CLONE_DIRECTORY}/.repoview/index"
+INDEX_TTL_MINUTES = 10
+
+# `snapshot` exports each student's repo as it was at the deadline to GRADED_DIRECTORY/<course>/<lab>
+GRADED_DIRECTORY = f"{CLONE_DIRECTORY}/graded"
+
+# how often the progress display is redrawn on a terminal, and printed as a line otherwise
+PROGRESS_REDRAW_SECONDS = 0.5
+PROGRESS_SECONDS = 10
+
 CYAN = "\x1b[36m"
-RESET = "\033[0m"
\ No newline at end of file
+RESET = "\033[0m"
@@ -0,0 +1,54 @@
+#state.py
+
+import copy
+import json
+import os
+import sqlite3
+import threading
+from timings import phase
+import settings as s
+
+
+class RepoState:
+    """What earlier runs learned about each student repo, keyed by repo name
+    (`{lab}_{student}`) and stored in SQLite.
+
+    Each repo's state is a small dict, e.g. the head sha and date that `log`
+    last saw. Rows are stored under `{org}/{repo}`, so the same lab in two
+    organizations keeps two states; use for_org to get the state of an
+    organization's repos.
+    """
+    def __init__(self, path=s.STATE_FILE):
+        self.org = None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS repos (name TEXT PRIMARY KEY, state TEXT)")
+
+    def for_org(self, org_name):
+        "Returns a RepoState for the repos of `org_name` that shares this one's connection"
+        other = copy.copy(self)
+        other.org = org_name
+        return other
+
+    def key(self, repo_name):
+        return f"{self.org}/{repo_name}" if self.org else repo_name
+
+    def get(self, repo_name):
+        "Returns the stored state of a repo, or an empty dict"
+        with self._lock:
+            row = self.db.execute("SELECT state FROM repos WHERE name = ?", (self.key(repo_name),)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def update(self, repo_name, **fields):
+        "Merges `fields` into the stored state of a repo"
+        with phase("state update"), self._lock:
+            key = self.key(repo_name)
+            row = self.db.execute("SELECT state FROM repos WHERE name = ?", (key,)).fetchone()
+            state = json.loads(row[0]) if row else {}
+            state.update(fields)
+            self.db.execute("INSERT OR REPLACE INTO repos VALUES (?, ?)", (key, json.dumps(state)))
+            self.db.commit()
+
+    def close(self):
+        self.db.close()
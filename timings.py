@@ -0,0 +1,146 @@
+#timings.py
+
+from collections import defaultdict
+from contextlib import contextmanager
+import json
+import os
+import re
+import threading
+import time
+import settings as s
+
+# path segments that name a particular org, repo, user or commit, replaced by
+# placeholders so requests are counted per endpoint rather than per repo
+ENDPOINT_PATTERNS = [
+    (re.compile(r"^/orgs/[^/]+"), "/orgs/{org}"),
+    (re.compile(r"^/repos/[^/]+/[^/]+"), "/repos/{owner}/{repo}"),
+    (re.compile(r"/collaborators/[^/]+$"), "/collaborators/{user}"),
+    (re.compile(r"/[0-9a-f]{40}$"), "/{sha}"),
+]
+
+
+def endpoint(method, url):
+    "Returns e.g. 'GET /repos/{owner}/{repo}/commits' for a request"
+    from urllib.parse import urlparse
+    path = urlparse(url).path
+    for pattern, placeholder in ENDPOINT_PATTERNS:
+        path = pattern.sub(placeholder, path)
+    return f"{method} {path}"
+
+
+class Profiler:
+    """Times the phases of a run and counts HTTP requests and bytes by endpoint.
+
+    Phases nest, per thread. Arguments given to a phase, such as the student
+    being worked on, apply to everything inside it, so requests can be traced
+    back to the student who caused them. Does nothing until enabled.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.started = time.perf_counter()
+        self.spans = []
+        self.endpoints = defaultdict(lambda: {"requests": 0, "seconds": 0.0, "sent": 0, "received": 0})
+        self.student_requests = defaultdict(int)
+        self.local = threading.local()
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+        self.started = time.perf_counter()
+
+    def context(self):
+        "The arguments of the phases the current thread is in"
+        stack = getattr(self.local, "stack", None)
+        return stack[-1] if stack else {}
+
+    @contextmanager
+    def phase(self, name, **args):
+        "Times the code in a `with` block as the phase `name`"
+        if not self.enabled:
+            yield
+            return
+        stack = self.local.__dict__.setdefault("stack", [])
+        stack.append({**self.context(), **args})
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            self.record(name, "phase", start, seconds, args)
+
+    def record(self, name, category, start, seconds, args):
+        with self._lock:
+            self.spans.append((name, category, start, seconds, threading.get_ident(), args))
+
+    def request(self, method, url, start, seconds, sent, received):
+        "Records an HTTP request sent at `start` that took `seconds`"
+        if not self.enabled:
+            return
+        name = endpoint(method, url)
+        student = self.context().get("student")
+        with self._lock:
+            totals = self.endpoints[name]
+            totals["requests"] += 1
+            totals["seconds"] += seconds
+            totals["sent"] += sent
+            totals["received"] += received
+            if student:
+                self.student_requests[student] += 1
+        self.record(name, "http", start, seconds, {"student": student} if student else {})
+
+    def summary(self, slowest=5):
+        "Prints a table of phases, of requests by endpoint, and the slowest students"
+        phases = defaultdict(list)
+        students = []
+        for name, category, start, seconds, thread, args in self.spans:
+            if category == "phase":
+                phases[name].append(seconds)
+            if name == "student":
+                students.append((seconds, args["student"]))
+
+        print(f"{s.CYAN}Profiled {time.perf_counter() - self.started:.2f} seconds.{s.RESET}")
+        print(f"{s.CYAN}{'phase':<24}{'count':>8}{'total s':>10}{'mean ms':>10}{'max ms':>10}{s.RESET}")
+        for name, times in sorted(phases.items(), key=lambda item: -sum(item[1])):
+            print(f"{name:<24}{len(times):>8}{sum(times):>10.2f}{1000 * sum(times) / len(times):>10.1f}{1000 * max(times):>10.1f}")
+        print()
+
+        if self.endpoints:
+            width = max(len(name) for name in self.endpoints)
+            print(f"{s.CYAN}{'endpoint':<{width}}{'requests':>10}{'total s':>10}{'KB sent':>10}{'KB received':>13}{s.RESET}")
+            for name, totals in sorted(self.endpoints.items(), key=lambda item: -item[1]["seconds"]):
+                print(f"{name:<{width}}{totals['requests']:>10}{totals['seconds']:>10.2f}"
+                      f"{totals['sent'] / 1024:>10.1f}{totals['received'] / 1024:>13.1f}")
+            print()
+
+        if students:
+            print(f"{s.CYAN}{'slowest students':<24}{'seconds':>10}{'requests':>10}{s.RESET}")
+            for seconds, student in sorted(students, reverse=True)[:slowest]:
+                print(f"{student:<24}{seconds:>10.2f}{self.student_requests.get(student, 0):>10}")
+            print()
+
+    def write_trace(self, path):
+        """Writes the spans as a Chrome trace (open in chrome://tracing or
+        https://ui.perfetto.dev), one row per thread.
+        """
+        pid = os.getpid()
+        events = [
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round((start - self.started) * 1e6),
+                "dur": round(seconds * 1e6),
+                "pid": pid,
+                "tid": thread,
+                "args": args,
+            }
+            for name, category, start, seconds, thread, args in self.spans
+        ]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+        print(f"Wrote a trace of {len(events)} events to '{path}'.")
+
+
+profiler = Profiler()
+phase = profiler.phase